@@ -1,10 +1,11 @@
 import numpy as np
 import pandas as pd
 import datetime as dt
-from pandas_datareader import data as web
-import yfinance as yf
-import warnings
-warnings.filterwarnings('ignore')
+import time
+import rolling_beta as rb
+import capm_screener as cs
+import instrument as ins
+import providers
 
 # interval = 'm'
 # tickers = ['AAPL']
@@ -17,7 +18,7 @@ warnings.filterwarnings('ignore')
 ### Import price data
 # Get adjusted close price
 # Use pandas_datareader
-def get_data(tickers, start, end, interval, OHLC='Adj Close', market=True):
+def get_data(tickers, start, end, interval, OHLC='Adj Close', market=True, provider='pandas_datareader'):
     if market == True:
         tickers.insert(0,'^GSPC')
     
@@ -26,15 +27,64 @@ def get_data(tickers, start, end, interval, OHLC='Adj Close', market=True):
     # monthly frequency
     frequency = frequency[interval]
 
+    prices = providers.get(provider).download(tickers, start, end, interval)
     df = pd.DataFrame()
     for t in tickers:
-        df[t] = web.get_data_yahoo(t, start, end, interval=interval)[OHLC]
+        df[t] = prices[(OHLC, t)]
     df.dropna(inplace=True)
     
     return df
 
+# Fake in-process stand-in for yf.download, used to run and benchmark offline
+def fake_download(tickers, start, end, interval='1d', seed=0, latency=0, **kwargs):
+    """Random-walk prices shaped like a multi-ticker yf.download result."""
+    if isinstance(tickers, str):
+        tickers = [tickers]
+    if latency:
+        time.sleep(latency)
+    freq = {'1d':'B', '1wk':'W-MON', '1mo':'MS'}[interval]
+    dates = pd.date_range(start, end, freq=freq, name='Date')
+    rng = np.random.default_rng(seed)
+
+    n, k = len(dates), len(tickers)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (n, k)), axis=0))
+    open_ = close * np.exp(rng.normal(0, 0.002, (n, k)))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.005, (n, k))))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.005, (n, k))))
+    volume = rng.integers(1e5, 1e7, (n, k)).astype(float)
+
+    fields = ['Adj Close', 'Close', 'High', 'Low', 'Open', 'Volume']
+    values = np.concatenate([close, close, high, low, open_, volume], axis=1)
+    columns = pd.MultiIndex.from_product([fields, tickers], names=['Price', 'Ticker'])
+    return pd.DataFrame(values, index=dates, columns=columns)
+
+# Batched yfinance download: all tickers and fields in one call per chunk
+# Returns one frame with (field, ticker) MultiIndex columns
+# download: a yf.download-like callable, defaults to the named provider's
+@ins.timed()
+def get_prices_yf(tickers, start, end, interval, fields=('Open','High','Low','Adj Close'), chunk_size=200, download=None, provider='yfinance'):
+    if download is None:
+        download = providers.get(provider).download
+    fields = list(fields)
+
+    frames = []
+    for i in range(0, len(tickers), chunk_size):
+        chunk = list(tickers[i:i+chunk_size])
+        raw = download(chunk, start=start, end=end, interval=interval, group_by='column',
+                       auto_adjust=False, progress=False)
+        ins.count('yf_downloads')
+        ins.count('yf_rows', len(raw))
+        # older yfinance returns flat columns for a single ticker
+        if not isinstance(raw.columns, pd.MultiIndex):
+            raw.columns = pd.MultiIndex.from_product([raw.columns, chunk])
+        frames.append(raw[fields])
+
+    prices = pd.concat(frames, axis=1) if len(frames) > 1 else frames[0]
+    # one reindex puts fields and tickers in request order (missing tickers -> NaN)
+    return prices.reindex(columns=pd.MultiIndex.from_product([fields, list(tickers)]))
+
 # Use yfinance 
-def get_data_yf(tickers, start, end, interval, OHLC='Adj Close', market=True):
+def get_data_yf(tickers, start, end, interval, OHLC='Adj Close', market=True, download=None, provider='yfinance'):
     if market == True:
         tickers.insert(0,'^GSPC')
     
@@ -43,25 +93,23 @@ def get_data_yf(tickers, start, end, interval, OHLC='Adj Close', market=True):
     # monthly frequency
     frequency = frequency[interval]
 
-    df = pd.DataFrame()
-    for t in tickers:
-        df[t] = yf.download(t, start, end, interval=interval)[OHLC]
+    df = get_prices_yf(tickers, start, end, interval, fields=[OHLC], download=download, provider=provider)[OHLC]
     df.dropna(inplace=True)
     
     return df
 
 # Get total price with OHLC using pandas_datareader
-def get_OHLC(tickers, start, end, interval,OHLC='Adj Close'):
+def get_OHLC(tickers, start, end, interval,OHLC='Adj Close', provider='pandas_datareader'):
     tickers.insert(0,'^GSPC')
     # compounding frequency per annum
     frequency = {'d':252, 'w':52, 'm': 12}
     # monthly frequency
     frequency = frequency[interval]
 
-    open_df = get_data(tickers, start, end, interval,OHLC='Open')
-    high_df = get_data(tickers, start, end, interval,OHLC='High')
-    low_df = get_data(tickers, start, end, interval,OHLC='Low')
-    adjc_df = get_data(tickers, start, end, interval)
+    open_df = get_data(tickers, start, end, interval,OHLC='Open', market=False, provider=provider)
+    high_df = get_data(tickers, start, end, interval,OHLC='High', market=False, provider=provider)
+    low_df = get_data(tickers, start, end, interval,OHLC='Low', market=False, provider=provider)
+    adjc_df = get_data(tickers, start, end, interval, market=False, provider=provider)
     
     OHLC = pd.concat([open_df,
                high_df,
@@ -70,7 +118,7 @@ def get_OHLC(tickers, start, end, interval,OHLC='Adj Close'):
     return OHLC
 
 # Get total price with OHLC using yfinance
-def get_OHLC_yf(tickers, start, end, interval,OHLC='Adj Close', market=True):
+def get_OHLC_yf(tickers, start, end, interval,OHLC='Adj Close', market=True, download=None, provider='yfinance'):
     if market == True:
         tickers.insert(0,'^GSPC')
 
@@ -79,15 +127,11 @@ def get_OHLC_yf(tickers, start, end, interval,OHLC='Adj Close', market=True):
     # monthly frequency
     frequency = frequency[interval]
 
-    open_df = get_data(tickers, start, end, interval,OHLC='Open')
-    high_df = get_data(tickers, start, end, interval,OHLC='High')
-    low_df = get_data(tickers, start, end, interval,OHLC='Low')
-    adjc_df = get_data(tickers, start, end, interval)
+    # single batched fetch for all four fields
+    fields = ['Open', 'High', 'Low', 'Adj Close']
+    prices = get_prices_yf(tickers, start, end, interval, fields=fields, download=download, provider=provider)
     
-    OHLC = pd.concat([open_df,
-               high_df,
-               low_df, 
-               adjc_df], join="inner").sort_values(by='Date')
+    OHLC = pd.concat([prices[f].dropna() for f in fields], join="inner").sort_index(kind='stable')
     return OHLC
 
 ### Two returns calculation methods
@@ -125,50 +169,70 @@ def annual_logret(log_return, frequency):
 
 
 ### Beta of stocks
-# risk-free rate of annualized risk-free rate
-# Difference from including risk_free is negigible, using risk-free=0 is fine
-def get_beta(stock_returns, risk_free=0):
-    
+# Beta of every column against the market in one vectorized pass
+# Each column uses only the dates where both it and the market are observed
+# stats=True adds Alpha, R2, standard errors and the number of observations
+@ins.timed()
+def get_betas(stock_returns, market='^GSPC', risk_free=0, frequency=12, stats=False):
     # De-annualize risk-free rate
     periodic_rf = (1+risk_free)**(1/frequency)-1
-    
+
     tickers = stock_returns.columns
-    Beta_df = pd.DataFrame(columns = ['ticker','Beta'])
-    stock_returns = stock_returns - periodic_rf
-
-    for stock in range(len(tickers)):
-        stock_mkt_cov = stock_returns.cov().loc['^GSPC',tickers[stock]]
-        mkt_var = stock_returns['^GSPC'].var()
-        Beta = stock_mkt_cov/mkt_var
-        Beta_df = Beta_df.append({'ticker':tickers[stock],'Beta':Beta },ignore_index=True)
-        
+    R = stock_returns.to_numpy(dtype=float) - periodic_rf
+    m = R[:, tickers.get_loc(market)]
+
+    # de-mean first so the moment sums below stay numerically stable
+    center_m = np.nanmean(m)
+    center_R = np.nanmean(R, axis=0)
+    m = m - center_m
+    R = R - center_R
+    mask = (~np.isnan(R) & ~np.isnan(m)[:, None]).astype(float)
+    m0 = np.nan_to_num(m)
+    R0 = np.where(mask > 0, R, 0)
+
+    # per-column masked moments, each one matrix-vector product
+    n = mask.sum(axis=0)
+    sum_m = mask.T @ m0
+    sum_mm = mask.T @ (m0 * m0)
+    sum_r = R0.sum(axis=0)
+    sum_mr = R0.T @ m0
+
+    sxx = sum_mm - sum_m**2 / n
+    sxy = sum_mr - sum_m * sum_r / n
+    Beta = sxy / sxx
+    Beta_df = pd.DataFrame({'ticker': tickers, 'Beta': Beta})
+
+    if stats:
+        # masked means back on the original return scale
+        mean_m = sum_m / n + center_m
+        mean_r = sum_r / n + center_R
+        syy = (R0 * R0).sum(axis=0) - sum_r**2 / n
+        ssr = np.maximum(syy - Beta * sxy, 0)
+        resid_var = ssr / (n - 2)
+        Beta_df['Alpha'] = mean_r - Beta * mean_m
+        Beta_df['R2'] = 1 - ssr / syy
+        Beta_df['Beta SE'] = np.sqrt(resid_var / sxx)
+        Beta_df['Alpha SE'] = np.sqrt(resid_var * (1/n + mean_m**2 / sxx))
+        Beta_df['N'] = n.astype(int)
+
     return Beta_df
 
+# risk-free rate of annualized risk-free rate
+# Difference from including risk_free is negigible, using risk-free=0 is fine
+def get_beta(stock_returns, risk_free=0, frequency=12):
+    return get_betas(stock_returns, risk_free=risk_free, frequency=frequency)
+
 # Mkt_ret_simp = annual_simpret(simpret['^GSPC'], frequency) 
 # actual_simpret = annual_simpret(simpret, frequency)
 
 # risk-free, Mkt, actual stock returns must be annualized returns
+@ins.timed()
 def CAPM(beta_df, risk_free, Mkt_ret, actual_ret): # expected returns in annualized terms
-    stocks = list(beta_df['ticker'])[1:] # tickers except for S&P500 index
-    ER_df = pd.DataFrame(columns = ['ticker','CAPM ER'])
-    
-    for stock in stocks:
-        beta = float(beta_df[beta_df['ticker']==stock]['Beta'])
-        expected_return = risk_free + beta*(Mkt_ret - risk_free)
-        actual_return = actual_ret[stock]
-        return_gap = actual_return - expected_return
-        ER_df = ER_df.append({'ticker':stock,
-                              'Beta': beta,
-                              'CAPM ER':expected_return, 
-                              'Actual Return': actual_return,
-                              'Return Gap': return_gap},
-                             ignore_index=True)
-        
-    
-    # if CAPM Expected Returns < actual returns, undervalued
-    ER_df['Undervalued'] = ER_df['CAPM ER'] < ER_df['Actual Return']
-    ER_df = ER_df.sort_values(by=['Return Gap'], ascending=False)
-    return ER_df
+    stocks = beta_df.iloc[1:] # tickers except for S&P500 index
+    actual_return = pd.Series(actual_ret)[stocks['ticker']].to_numpy()
+
+    ER_df = cs.CAPM_screen(stocks['ticker'], stocks['Beta'], Mkt_ret, actual_return, risk_free)
+    return ER_df[['ticker','CAPM ER','Beta','Actual Return','Return Gap','Undervalued']]
 
 def rolling_beta(stock_df, ticker, beta_window, ma_window):
     ticker = ticker
@@ -189,29 +253,29 @@ def rolling_beta(stock_df, ticker, beta_window, ma_window):
 
 # Get Historical Beta, one datapoint per each stock
 def get_beta_yf(stock_returns):
-    tickers = stock_returns.columns
-    Beta_df = pd.DataFrame(columns = ['ticker','Beta'])
-
-    for stock in range(len(tickers)):
-        stock_mkt_cov = stock_returns.cov().loc['^GSPC',tickers[stock]]
-        mkt_var = stock_returns['^GSPC'].var()
-        Beta = stock_mkt_cov/mkt_var
-        Beta_df = Beta_df.append({'ticker':tickers[stock],'Beta':Beta },ignore_index=True)
-        
-    return Beta_df
+    return get_betas(stock_returns)
 
-# Get Time series of rolling Betas per each stock
-def rolling_beta_yf(stock_df, ticker, beta_window, ma_window): # takes in single ticker at a time
+# Get Time series of rolling Betas for every stock at once
+# Running window sums, O(1) per date and ticker; halflife adds EWMA betas
+@ins.timed()
+def rolling_betas_yf(stock_df, beta_window, ma_window, market='^GSPC', halflife=None):
+    stock_returns = simp_ret(stock_df)
+    tickers = stock_returns.columns.drop(market)
+    mkt = stock_returns[market].to_numpy(dtype=float)
+    stocks = stock_returns[tickers].to_numpy(dtype=float)
 
-    stock_returns = simp_ret(stock_df[['^GSPC',ticker]]).rolling(beta_window)
-    stock_mkt_cov = stock_returns.cov().iloc[1::2].drop(columns=[ticker]).dropna()
-    stock_mkt_cov.index = stock_mkt_cov.index.droplevel(level=1)
+    Beta = rb.rolling_betas(mkt, stocks, beta_window)
+    Beta_ma = rb.moving_average(Beta, ma_window)
+    Beta = pd.DataFrame(Beta, index=stock_returns.index, columns=tickers)
+    Beta_ma = pd.DataFrame(Beta_ma, index=stock_returns.index, columns=tickers)
 
-    mkt_var = stock_returns.cov().iloc[::2].drop(columns=[ticker]).dropna()
-    mkt_var.index =mkt_var.index.droplevel(level=1)
-    Beta = stock_mkt_cov/mkt_var
-    Beta = Beta.rename(columns={'^GSPC':ticker})
-    
-    Beta_ma = Beta.rolling(ma_window).mean().dropna()
+    if halflife:
+        Beta_ewm = pd.DataFrame(rb.ewma_betas(mkt, stocks, halflife), index=stock_returns.index, columns=tickers)
+        return Beta, Beta_ma, Beta_ewm
+    return Beta, Beta_ma
+
+# Get Time series of rolling Betas per each stock
+def rolling_beta_yf(stock_df, ticker, beta_window, ma_window): # takes in single ticker at a time
+    Beta, Beta_ma = rolling_betas_yf(stock_df[['^GSPC',ticker]], beta_window, ma_window)
     
-    return Beta, Beta_ma
\ No newline at end of file
+    return Beta.dropna(), Beta_ma.dropna()
\ No newline at end of file
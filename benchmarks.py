@@ -0,0 +1,166 @@
+""" Offline benchmark suite for the numerical hot paths.
+
+Synthetic prices and fundamentals are generated from a fixed seed, so every run
+measures the same inputs. Each case records the best wall time over `repeat` runs
+and the tracemalloc peak of one extra run. A stored baseline JSON can be compared
+against, failing on any case slower (or heavier) than baseline * (1 + threshold).
+
+    python benchmarks.py --save baseline.json
+    python benchmarks.py --baseline baseline.json --threshold 0.25
+"""
+import argparse
+import contextlib
+import io
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import CAPM_fn as capm
+import finance_scrapper as fs
+import peer_scoring as ps
+
+SIZES = {'small': 10, 'medium': 500, 'universe': 5000}
+# periods per year and years of history
+FREQUENCIES = {'monthly': (12, 20), 'daily': (252, 10)}
+
+
+### Synthetic data
+def synthetic_prices(n_tickers, frequency='monthly', seed=0):
+    """Adj Close prices with the market '^GSPC' first, stocks loading on it with random betas."""
+    periods, years = FREQUENCIES[frequency]
+    n = periods * years + 1
+    rng = np.random.default_rng(seed)
+    vol = 0.16 / np.sqrt(periods)
+    mkt = rng.normal(0.08 / periods, vol, n)
+    beta = rng.uniform(0.3, 1.8, n_tickers)
+    stocks = mkt[:, None] * beta + rng.normal(0, 1.5 * vol, (n, n_tickers))
+    returns = np.column_stack([mkt, stocks])
+    returns[0] = 0
+
+    freq = 'ME' if frequency == 'monthly' else 'B'
+    index = pd.date_range('2000-01-01', periods=n, freq=freq, name='Date')
+    columns = ['^GSPC'] + ['T{}'.format(i) for i in range(n_tickers)]
+    return pd.DataFrame(100 * np.exp(np.cumsum(returns, axis=0)), index=index, columns=columns)
+
+
+def synthetic_fundamentals(n_tickers, n_years=15, seed=0):
+    """(tickers x years) ShE (last 5 years only), WASHO, ShE per share 3Y growth and ROE."""
+    rng = np.random.default_rng(seed)
+    ROE = rng.normal(0.12, 0.05, (n_tickers, n_years))
+    WASHO = 1e6 * rng.uniform(50, 5000, (n_tickers, 1)) * np.cumprod(1 - rng.uniform(0, 0.03, (n_tickers, n_years)), axis=1)
+    ShE = 1e9 * rng.uniform(0.5, 50, (n_tickers, 1)) * np.cumprod(1 + ROE * 0.6, axis=1)
+    ShE[:, :-5] = np.nan
+    growth = rng.normal(0.08, 0.05, (n_tickers, n_years))
+    return {'ShE': ShE, 'WASHO': WASHO, 'ShEpsh_g_3Y': growth, 'ROE': ROE}
+
+
+def synthetic_peers(n_tickers, n_metrics=30, n_groups=5, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(0, 1, (n_tickers, n_metrics))
+    X[rng.random(X.shape) < 0.05] = np.nan
+    direction = rng.choice([-1, 0, 1], n_metrics)
+    membership = np.zeros((n_metrics, n_groups))
+    membership[np.arange(n_metrics), rng.integers(0, n_groups, n_metrics)] = 1
+    return X, direction, membership
+
+
+### Cases: name -> (needs prices, setup(n_tickers, frequency) -> zero-argument callable)
+def _get_GR_all(ROE):
+    dates = pd.Index([str(y) for y in range(ROE.shape[1])])
+    for row in ROE:
+        fs.get_GR(pd.Series(row, index=dates))
+
+
+CASES = {
+    'get_beta_yf': (True, lambda n, f: (lambda r=capm.simp_ret(synthetic_prices(n, f)): capm.get_beta_yf(r))),
+    'rolling_beta_yf': (True, lambda n, f: (lambda p=synthetic_prices(n, f), w=FREQUENCIES[f][0]:
+                                            capm.rolling_betas_yf(p, beta_window=5 * w, ma_window=w // 2))),
+    'reconstruct_BV': (False, lambda n, f: (lambda d=synthetic_fundamentals(n):
+                                            fs.reconstruct_BV_panel(d['ShE'], d['WASHO'], d['ShEpsh_g_3Y']))),
+    'S_RIM_ROE_estimates': (False, lambda n, f: (lambda d=synthetic_fundamentals(n):
+                                                 fs.S_RIM_ROE_estimates_array(d['ROE'][:, -5:]))),
+    'get_GR': (False, lambda n, f: (lambda d=synthetic_fundamentals(n): _get_GR_all(d['ROE'][:, -5:]))),
+    'peer_scoring': (False, lambda n, f: (lambda a=synthetic_peers(n): ps.composite_scores(*a))),
+}
+
+
+def measure(fn, repeat=3):
+    """Best wall time over `repeat` runs and peak traced memory (MB) of one more run."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': best, 'peak_MB': peak / 1e6}
+
+
+def run(cases=None, sizes=None, frequencies=None, repeat=3, verbose=True):
+    """{case/size[/frequency]: {'seconds', 'peak_MB'}} for every selected combination."""
+    results = {}
+    for name in cases or CASES:
+        needs_prices, setup = CASES[name]
+        for size in sizes or SIZES:
+            for frequency in (frequencies or FREQUENCIES) if needs_prices else [None]:
+                key = '/'.join(k for k in [name, size, frequency] if k)
+                # reconstruct_BV and get_GR echo their errors and regimes
+                with contextlib.redirect_stdout(io.StringIO()):
+                    results[key] = measure(setup(SIZES[size], frequency or 'monthly'), repeat)
+                if verbose:
+                    print('{:<40} {:>10.4f}s {:>10.1f}MB'.format(key, results[key]['seconds'], results[key]['peak_MB']))
+    return results
+
+
+def compare(results, baseline, threshold=0.25, min_seconds=0.005):
+    """Cases slower or heavier than baseline * (1 + threshold).
+
+    Timings below min_seconds in the baseline are too noisy to compare.
+    """
+    rows = []
+    for key, now in results.items():
+        if key not in baseline:
+            continue
+        base = baseline[key]
+        for metric in ['seconds', 'peak_MB']:
+            if metric == 'seconds' and base[metric] < min_seconds:
+                continue
+            ratio = now[metric] / base[metric] if base[metric] else np.inf
+            rows.append({'case': key, 'metric': metric, 'baseline': base[metric], 'now': now[metric],
+                         'ratio': ratio, 'regression': ratio > 1 + threshold})
+    return pd.DataFrame(rows, columns=['case', 'metric', 'baseline', 'now', 'ratio', 'regression'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cases', nargs='*', choices=list(CASES))
+    parser.add_argument('--sizes', nargs='*', choices=list(SIZES))
+    parser.add_argument('--frequencies', nargs='*', choices=list(FREQUENCIES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--save', help='write results as the new baseline JSON')
+    parser.add_argument('--baseline', help='baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    results = run(args.cases, args.sizes, args.frequencies, args.repeat)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            report = compare(results, json.load(f), args.threshold)
+        print(report.to_string(index=False))
+        if report['regression'].any():
+            print('Regressions above {:.0%}:'.format(args.threshold), ', '.join(report.loc[report['regression'], 'case'].unique()))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+""" Cross-sectional expected-return screener (CAPM and multi-factor).
+
+Takes aligned vectors for the whole universe and computes expected returns, return
+gaps and the undervalued flag in one step. The top k names are picked with
+argpartition, so only those k are sorted. All returns are annualized.
+"""
+import re
+import numpy as np
+import pandas as pd
+
+# Quandl USTREASURY/YIELD column labels, e.g. '3 MO', '10 YR'
+UNIT_YEARS = {'MO': 1/12, 'YR': 1}
+
+
+def maturity_years(label):
+    if isinstance(label, (int, float, np.number)):
+        return float(label)
+    num, unit = re.match(r'\s*([\d.]+)\s*(MO|YR)', str(label).upper()).groups()
+    return float(num) * UNIT_YEARS[unit]
+
+
+# Risk-free rate as a scalar, or interpolated at `horizon` years on a term structure
+# given as a Series indexed by maturity (years or '10 YR' style labels)
+def risk_free_rate(risk_free, horizon=1):
+    if np.ndim(risk_free) == 0:
+        return float(risk_free)
+    curve = pd.Series(risk_free).dropna()
+    maturities = np.array([maturity_years(m) for m in curve.index])
+    order = np.argsort(maturities)
+    return float(np.interp(horizon, maturities[order], curve.to_numpy(dtype=float)[order]))
+
+
+# Positions of the k largest values (NaN last), largest first
+def top_k(values, k, largest=True):
+    values = np.asarray(values, dtype=float)
+    key = np.where(np.isnan(values), -np.inf, values if largest else -values)
+    if k is None or k >= len(key):
+        return np.argsort(-key, kind='stable')
+    part = np.argpartition(-key, k - 1)[:k]
+    return part[np.argsort(-key[part], kind='stable')]
+
+
+def screen(tickers, expected_return, actual_return, k=None, extra=None):
+    """Return gap table sorted by 'Return Gap', only the top k rows if k is given."""
+    expected_return = np.asarray(expected_return, dtype=float)
+    actual_return = np.asarray(actual_return, dtype=float)
+    return_gap = actual_return - expected_return
+
+    pos = top_k(return_gap, k)
+    out = {'ticker': np.asarray(tickers, dtype=object)[pos]}
+    for name, values in (extra or {}).items():
+        out[name] = np.asarray(values)[pos]
+    out['Expected Return'] = expected_return[pos]
+    out['Actual Return'] = actual_return[pos]
+    out['Return Gap'] = return_gap[pos]
+    # if expected returns < actual returns, undervalued
+    out['Undervalued'] = expected_return[pos] < actual_return[pos]
+    return pd.DataFrame(out, index=pos)
+
+
+def CAPM_screen(tickers, beta, Mkt_ret, actual_ret, risk_free, k=None, horizon=1):
+    """CAPM ER = rf + beta * (Mkt_ret - rf) for every ticker at once.
+
+    beta, actual_ret: vectors aligned with tickers. risk_free: scalar or term structure.
+    """
+    rf = risk_free_rate(risk_free, horizon)
+    beta = np.asarray(beta, dtype=float)
+    expected_return = rf + beta * (Mkt_ret - rf)
+
+    df = screen(tickers, expected_return, actual_ret, k, extra={'Beta': beta})
+    return df.rename(columns={'Expected Return': 'CAPM ER'})
+
+
+# Annualized mean factor premia from a factor return frame (e.g. gff.famaFrench3Factor)
+def factor_premia(factors, frequency=12, exclude=('RF', 'date_ff_factors')):
+    cols = [c for c in factors.columns if c not in exclude]
+    return factors[cols].astype(float).mean() * frequency
+
+
+def factor_screen(loadings, premia, actual_ret, risk_free, k=None, horizon=1):
+    """Multi-factor ER = rf + loadings @ premia.
+
+    loadings: (tickers x factors) DataFrame, e.g. Mkt-RF, SMB, HML betas.
+    premia: annualized premium per factor. actual_ret: Series by ticker.
+    """
+    rf = risk_free_rate(risk_free, horizon)
+    premia = pd.Series(premia).reindex(loadings.columns)
+    L = loadings.to_numpy(dtype=float)
+    expected_return = rf + L @ premia.to_numpy(dtype=float)
+
+    actual = pd.Series(actual_ret).reindex(loadings.index).to_numpy(dtype=float)
+    extra = {name: L[:, j] for j, name in enumerate(loadings.columns)}
+    return screen(loadings.index, expected_return, actual, k, extra)
@@ -0,0 +1,236 @@
+""" Batched CAPM and Fama-French cost of equity for every ticker at once.
+
+Excess returns are a (dates x tickers) matrix regressed on one factor matrix X
+(intercept + factors). X'X is factored once (Cholesky) and its inverse applied to
+X'Y for all tickers, so a universe costs one small factorization per window instead
+of one regression per ticker:
+
+    B = (X'X)^-1 X'Y,   COE = rf + loadings @ annualized factor premia
+
+Factors are the getFamaFrenchFactors frames (decimal returns per period, 'RF' and an
+optional 'date_ff_factors' column), returns are e.g. capm.simp_ret(prices).
+"""
+import numpy as np
+import pandas as pd
+
+import capm_screener as cs
+from rolling_beta import window_sums
+
+MODELS = {'CAPM': ['Mkt-RF'],
+          'FF3': ['Mkt-RF', 'SMB', 'HML'],
+          'FF5': ['Mkt-RF', 'SMB', 'HML', 'RMW', 'CMA']}
+# periods per year -> calendar period used to match return and factor dates
+PERIODS = {12: 'M', 52: 'W', 252: 'D'}
+
+
+### Inputs
+def factor_names(model):
+    return MODELS[model] if isinstance(model, str) else list(model)
+
+
+def align(returns, factors, model='FF3', frequency=12):
+    """Returns and factors on their common periods (month-start yfinance dates
+    match month-end French dates), dropping periods with a missing factor."""
+    if 'date_ff_factors' in factors.columns:
+        factors = factors.set_index('date_ff_factors')
+    factors = factors[factor_names(model) + ['RF']].astype(float).dropna()
+    freq = PERIODS[frequency]
+    returns = returns.set_axis(pd.DatetimeIndex(returns.index).to_period(freq), axis=0)
+    factors = factors.set_axis(pd.DatetimeIndex(factors.index).to_period(freq), axis=0)
+    common = returns.index.intersection(factors.index)
+    return returns.loc[common], factors.loc[common]
+
+
+def normal_inverse(XtX, rcond=1e-12):
+    """(X'X)^-1 through its Cholesky factor, for one matrix or a stack of them.
+
+    Singular matrices (e.g. a factor constant over the window) give NaN inverses
+    instead of failing the whole stack.
+    """
+    eig = np.linalg.eigvalsh(XtX)
+    singular = ~(eig[..., 0] > rcond * np.abs(eig[..., -1]))
+    XtX = np.where(singular[..., None, None], np.eye(XtX.shape[-1]), XtX)
+    L_inv = np.linalg.inv(np.linalg.cholesky(XtX))
+    inv = np.swapaxes(L_inv, -1, -2) @ L_inv
+    return np.where(singular[..., None, None], np.nan, inv)
+
+
+def premia_array(premia, names):
+    """Annual factor premia in factor order, from a name-keyed mapping or a sequence."""
+    if isinstance(premia, (dict, pd.Series)):
+        return np.asarray(pd.Series(premia)[names], dtype=float)
+    premia = np.asarray(premia, dtype=float).ravel()
+    if len(premia) != len(names):
+        raise ValueError('{} premia given for the factors {}'.format(len(premia), names))
+    return premia
+
+
+def centered(F, Y):
+    # centre factors and returns so the moment sums stay precise; slopes are unchanged
+    # and the intercept is moved back with alpha = b_0 + mean_y - slopes @ mean_f
+    cf = F.mean(axis=0)
+    cy = np.nanmean(Y, axis=0)
+    X = np.column_stack([np.ones(len(F)), F - cf])
+    return X, Y - cy, cf, cy
+
+
+### Full sample
+def factor_regression(excess, F, frequency=12):
+    """OLS of every column of `excess` (dates x tickers) on the factors F (dates x k).
+
+    Complete columns share one X'X inverse; columns with missing dates get their own
+    from the observed rows. Returns loadings (tickers x k), periodic alpha, annualized
+    residual volatility, R2 and the number of observations.
+    """
+    Y = np.asarray(excess, dtype=float)
+    F = np.asarray(F, dtype=float)
+    X, Yc, cf, cy = centered(F, Y)
+    p = X.shape[1]
+    valid = ~np.isnan(Yc)
+    Y0 = np.where(valid, Yc, 0)
+    n = valid.sum(axis=0)
+
+    B = np.full((p, Y.shape[1]), np.nan)
+    XtY = X.T @ Y0
+    complete = n == len(Y)
+    if complete.any():
+        B[:, complete] = normal_inverse(X.T @ X) @ XtY[:, complete]
+
+    partial = ~complete & (n > p)
+    if partial.any():
+        V = valid[:, partial].astype(float)
+        XtX = np.einsum('dt,dp,dq->tpq', V, X, X)
+        B[:, partial] = (normal_inverse(XtX) @ XtY[:, partial].T[:, :, None])[:, :, 0].T
+
+    syy = (Y0 * Y0).sum(axis=0)
+    ssr = np.maximum(syy - (B * XtY).sum(axis=0), 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        resid_var = ssr / (n - p)
+        r2 = 1 - ssr / syy
+    slopes = B[1:]
+    return {'loadings': slopes.T,
+            'alpha': B[0] + cy - cf @ slopes,
+            'resid_vol': np.sqrt(resid_var * frequency),
+            'r2': r2,
+            'n': n}
+
+
+def estimate_coe(returns, factors, model='FF3', frequency=12, rf=None, premia=None):
+    """Loadings, residual volatility and implied cost of equity for every ticker.
+
+    returns: (dates x tickers) periodic returns. rf: annual risk-free rate, default
+    the sample mean of RF * frequency as in the S-RIM notebook. premia: annual factor
+    premia by name or in factor order, default capm_screener.factor_premia of the sample.
+    All outputs are arrays in ticker order, ready for the panel valuations.
+    """
+    names = factor_names(model)
+    returns, factors = align(returns, factors, model, frequency)
+    excess = returns.to_numpy(dtype=float) - factors['RF'].to_numpy()[:, None]
+
+    out = factor_regression(excess, factors[names].to_numpy(), frequency)
+    rf = factors['RF'].mean() * frequency if rf is None else rf
+    premia = premia_array(cs.factor_premia(factors[names], frequency) if premia is None else premia, names)
+    out['COE'] = rf + out['loadings'] @ premia
+    out.update({'tickers': returns.columns, 'factors': names, 'rf': rf, 'premia': premia})
+    return out
+
+
+def to_frame(result):
+    """Ticker-indexed table of estimate_coe output (loadings columns fit cs.factor_screen)."""
+    df = pd.DataFrame(result['loadings'], index=pd.Index(result['tickers'], name='ticker'), columns=result['factors'])
+    for col in ['alpha', 'resid_vol', 'r2', 'n', 'COE']:
+        df[col] = result[col]
+    return df
+
+
+### Rolling and expanding windows
+def rolling_coe(returns, factors, model='FF3', window=60, frequency=12, rf=None, premia=None,
+                expanding=False, min_periods=None, block=256):
+    """Point-in-time loadings and COE on every date from trailing windows.
+
+    Rolling windows use the last `window` periods; a ticker needs all of them observed
+    (NaN otherwise, like rolling_beta). expanding=True uses every period since each
+    ticker's first observation, from min_periods (default window) on, until its first
+    gap. X'X is inverted once per date, and once per date and start date when expanding;
+    dates whose X'X is singular are NaN. Tickers go through in blocks of `block` columns.
+    rf: annual rate, scalar or one per date; default the window mean of RF * frequency.
+    premia: annual factor premia by name or in factor order; default the window mean
+    of each factor * frequency.
+    Returns dates, loadings (dates x tickers x k), alpha, resid_vol and COE (dates x tickers).
+    """
+    names = factor_names(model)
+    returns, factors = align(returns, factors, model, frequency)
+    Y = returns.to_numpy(dtype=float) - factors['RF'].to_numpy()[:, None]
+    F = factors[names].to_numpy()
+    X, Yc, cf, cy = centered(F, Y)
+    D, T = Y.shape
+    p = X.shape[1]
+    if not expanding and window <= p:
+        raise ValueError('window of {} periods cannot fit {} factors and an intercept'.format(window, len(names)))
+    min_periods = min_periods or window
+
+    valid = ~np.isnan(Yc)
+    Y0 = np.where(valid, Yc, 0)
+    XX = X[:, :, None] * X[:, None, :]
+    B = np.full((D, p, T), np.nan)
+    ssr = np.full((D, T), np.nan)
+
+    def fit(P, S_XY, S_YY, ok, cols):
+        b = P @ S_XY
+        b[~np.broadcast_to(ok[:, None, :], b.shape)] = np.nan
+        B[:, :, cols] = b
+        ssr[:, cols] = np.maximum(S_YY - (b * S_XY).sum(axis=1), 0)
+
+    if not expanding:
+        S_XX = window_sums(XX, window)
+        S_XX[:window - 1] = np.eye(p)
+        P = normal_inverse(S_XX)
+        for j in range(0, T, block):
+            cols = slice(j, j + block)
+            S_n = window_sums(valid[:, cols].astype(float), window)
+            fit(P, window_sums(X[:, :, None] * Y0[None, :, cols].transpose(1, 0, 2), window),
+                window_sums(Y0[:, cols] ** 2, window), S_n == window, cols)
+        n_obs = np.full((D, T), float(window))
+    else:
+        C_XX = np.cumsum(XX, axis=0)
+        first = np.where(valid.any(axis=0), valid.argmax(axis=0), D)
+        t = np.arange(D)
+        n_obs = np.zeros((D, T))
+        for s in np.unique(first[first < D]):
+            group = np.flatnonzero(first == s)
+            before = (lambda c: c[s - 1] if s > 0 else 0)
+            span = t - s + 1
+            S_XX = C_XX - before(C_XX)
+            S_XX[span < max(min_periods, p)] = np.eye(p)
+            P = normal_inverse(S_XX)
+            for j in range(0, len(group), block):
+                cols = group[j:j + block]
+                C_XY = np.cumsum(X[:, :, None] * Y0[:, None, cols], axis=0)
+                C_YY = np.cumsum(Y0[:, cols] ** 2, axis=0)
+                C_n = np.cumsum(valid[:, cols], axis=0)
+                S_n = C_n - before(C_n)
+                ok = (span[:, None] >= max(min_periods, p + 1)) & (S_n == span[:, None])
+                fit(P, C_XY - before(C_XY), C_YY - before(C_YY), ok, cols)
+            n_obs[:, group] = span[:, None]
+
+    slopes = B[:, 1:, :]                                   # (dates x k x tickers)
+    alpha = B[:, 0, :] + cy - np.einsum('k,dkt->dt', cf, slopes)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        resid_vol = np.sqrt(ssr / (n_obs - p) * frequency)
+    resid_vol[np.isnan(alpha)] = np.nan
+
+    # point-in-time rf and premia from the same window (expanding: since the first date)
+    if expanding:
+        count = np.arange(1, D + 1)[:, None]
+        window_mean = lambda a: np.cumsum(a, axis=0) / count
+    else:
+        window_mean = lambda a: window_sums(a, window) / window
+    RF = factors['RF'].to_numpy()[:, None]
+    rf = window_mean(RF)[:, 0] * frequency if rf is None else np.broadcast_to(np.asarray(rf, dtype=float), (D,))
+    premia = (window_mean(F) * frequency if premia is None
+              else np.broadcast_to(premia_array(premia, names), (D, len(names))))
+    COE = rf[:, None] + np.einsum('dk,dkt->dt', premia, slopes)
+
+    return {'dates': returns.index, 'tickers': returns.columns, 'factors': names,
+            'loadings': slopes.transpose(0, 2, 1), 'alpha': alpha, 'resid_vol': resid_vol,
+            'COE': COE, 'rf': rf, 'premia': premia}
@@ -0,0 +1,137 @@
+""" Universe-wide fundamentals feature store on a local SQLite file.
+
+Derived per-ticker series (ROE on end and average equity, the trailing geometric ROE
+growth rate, the S-RIM ROE_1 forecast and the DuPont components) are computed for every
+ticker at once from fmp_ingest long tables and stored keyed by (ticker, fiscal_date).
+New filings only recompute the tickers they belong to, and cross-sectional questions
+such as "all ROE_1 as of 2023-12-31" are a single indexed query.
+"""
+import sqlite3
+import numpy as np
+import pandas as pd
+
+from fmp_ingest import DATE_COL
+from srim_backtest import rolling_ROE_forecasts
+
+# stored inputs: long table field name per column
+INPUTS = {'NI': 'netIncome',
+          'BV': 'totalStockholdersEquity',
+          'ROE': 'returnOnEquity',
+          'NPM': 'netProfitMargin',
+          'ATO': 'assetTurnover',
+          'FL': 'companyEquityMultiplier'}
+FEATURES = ['ROE_endE', 'ROE_avgE', 'GR', 'ROE_1', 'ROE', 'NPM', 'ATO', 'FL']
+
+
+# Input columns keyed by (ticker, fiscal_date) from fmp_ingest long tables keyed by 'date'
+def input_rows(*longs):
+    fields = list(INPUTS.values())
+    parts = []
+    for long in longs:
+        # statements and ratios must share one date key or the joined rows misalign
+        key = long.attrs.get('date_col', DATE_COL)
+        if key != DATE_COL:
+            raise ValueError("long table keyed by {!r}, the feature store joins on {!r}; "
+                             "ingest with date_col={!r}".format(key, DATE_COL, DATE_COL))
+        rows = long[long['field'].isin(fields)]
+        if len(rows):
+            parts.append(rows.pivot(index=['ticker', 'date'], columns='field', values='value'))
+    wide = pd.concat(parts, axis=1) if parts else pd.DataFrame()
+    wide = wide.reindex(columns=fields).set_axis(list(INPUTS), axis=1)
+    wide.index = wide.index.set_names(['ticker', 'fiscal_date'])
+    return wide.groupby(level=[0, 1], observed=True).first().reset_index()
+
+
+# Features of full ticker histories, sorted by (ticker, fiscal_date)
+# GR and ROE_1 at each date use only the trailing `window` years of roe_endE
+def compute_features(inputs, window=5):
+    df = inputs.sort_values(['ticker', 'fiscal_date']).reset_index(drop=True)
+    codes = pd.Categorical(df['ticker']).codes
+    pos = df.groupby('ticker', observed=True).cumcount().to_numpy()
+    prev_BV = df.groupby('ticker', observed=True)['BV'].shift(1)
+
+    out = df[['ticker', 'fiscal_date']].copy()
+    out['ROE_endE'] = df['NI'] / df['BV']
+    out['ROE_avgE'] = df['NI'] / ((df['BV'] + prev_BV) / 2)
+
+    # (tickers x years) matrix, each ticker's history from the left, NaN padded
+    M = np.full((codes.max() + 1 if len(codes) else 0, pos.max() + 1 if len(pos) else 0), np.nan)
+    M[codes, pos] = out['ROE_endE'].to_numpy()
+
+    # get_GR over a window: prod(1 + pct_change) ** (1 / changes) telescopes to this ratio
+    k = window - 1
+    with np.errstate(invalid='ignore', divide='ignore'):
+        GR = np.full(M.shape, np.nan)
+        GR[:, k:] = (M[:, k:] / M[:, :-k]) ** (1 / k)
+    out['GR'] = GR[codes, pos]
+    out['ROE_1'] = rolling_ROE_forecasts(M, window)[codes, pos]
+
+    for col in ['ROE', 'NPM', 'ATO', 'FL']:
+        out[col] = df[col]
+    return out
+
+
+class FeatureStore:
+    """(ticker, fiscal_date) keyed inputs and features in one SQLite file."""
+
+    def __init__(self, path='features.sqlite', window=5):
+        self.path = path
+        self.window = window
+        self.con = sqlite3.connect(path)
+        with self.con:
+            for table, cols in [('inputs', list(INPUTS)), ('features', FEATURES)]:
+                self.con.execute('CREATE TABLE IF NOT EXISTS {} (ticker TEXT, fiscal_date TEXT, {}, '
+                                 'PRIMARY KEY (ticker, fiscal_date))'.format(table, ', '.join(c + ' REAL' for c in cols)))
+            self.con.execute('CREATE INDEX IF NOT EXISTS features_date ON features (fiscal_date)')
+
+    def upsert(self, table, df, cols):
+        df = df[['ticker', 'fiscal_date'] + cols].astype({'ticker': str})
+        df['fiscal_date'] = pd.to_datetime(df['fiscal_date']).dt.strftime('%Y-%m-%d')
+        # NaN is stored as NULL
+        rows = df.astype(object).where(df.notna(), None)
+        self.con.executemany('INSERT OR REPLACE INTO {} VALUES ({})'.format(table, ', '.join('?' * (len(cols) + 2))),
+                             rows.itertuples(index=False, name=None))
+
+    def read(self, table, where='', params=()):
+        df = pd.read_sql_query('SELECT * FROM {} {}'.format(table, where), self.con, params=params)
+        df['fiscal_date'] = pd.to_datetime(df['fiscal_date'])
+        return df
+
+    def update(self, *longs):
+        """Add new filings (fmp_ingest long tables keyed by fiscal 'date').
+
+        Inputs are merged into the stored ones, features are recomputed for the affected
+        tickers and rewritten from their earliest new fiscal date on. Returns rows written.
+        """
+        new = input_rows(*longs)
+        if len(new) == 0:
+            return 0
+        tickers = sorted(new['ticker'].astype(str).unique())
+        marks = ','.join('?' * len(tickers))
+        stored = self.read('inputs', 'WHERE ticker IN ({})'.format(marks), tickers)
+
+        # new values win, missing new values keep the stored ones
+        new['ticker'] = new['ticker'].astype(str)
+        key = ['ticker', 'fiscal_date']
+        merged = new.set_index(key).combine_first(stored.set_index(key)).reset_index()
+        since = new.groupby('ticker')['fiscal_date'].min()
+
+        features = compute_features(merged, self.window)
+        changed = features[features['fiscal_date'] >= features['ticker'].map(since)]
+        with self.con:
+            self.upsert('inputs', merged[merged['fiscal_date'] >= merged['ticker'].map(since)], list(INPUTS))
+            self.upsert('features', changed, FEATURES)
+        return len(changed)
+
+    def as_of(self, date, features=FEATURES):
+        """Latest features of every ticker with fiscal_date <= date, indexed by ticker."""
+        df = self.read('features', 'AS f JOIN (SELECT ticker AS t, MAX(fiscal_date) AS d FROM features '
+                       'WHERE fiscal_date <= ? GROUP BY ticker) ON f.ticker = t AND f.fiscal_date = d',
+                       (pd.Timestamp(date).strftime('%Y-%m-%d'),))
+        return df.set_index('ticker')[['fiscal_date'] + list(features)]
+
+    def history(self, ticker):
+        return self.read('features', 'WHERE ticker = ? ORDER BY fiscal_date', (ticker,)).set_index('fiscal_date')
+
+    def close(self):
+        self.con.close()
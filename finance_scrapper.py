@@ -1,24 +1,80 @@
 # https://site.financialmodelingprep.com/
 """ Available functions to scrape data
  when needed from Financial modeling Prep."""
+import threading
+from contextlib import contextmanager
+
 import requests
 import pandas as pd
 import numpy as np
 
+import instrument as ins
+import providers
+
+BASE_URL = 'https://financialmodelingprep.com/api/v3/'
+
+# Registered provider every FMP request goes through (providers.get(provider).get(url));
+# 'fmp' keeps one pooled requests session, created on the first request
+provider = 'fmp'
+
+# Optional persistent response cache, e.g. fmp_cache.FMPCache()
+cache = None
+
+_local = threading.local()
+
+
+def http_get(url):
+    override = getattr(_local, 'provider', None)
+    return (override or providers.get(provider)).get(url)
+
+
+@contextmanager
+def using(source):
+    """Send this thread's requests through the provider object `source` for a block."""
+    prev = getattr(_local, 'provider', None)
+    _local.provider = source
+    try:
+        yield source
+    finally:
+        _local.provider = prev
+
+
+@ins.timed('fmp.get_records')
+def get_records(endpoint, url, ticker, period='', limit='', growth=False):
+    """Get the JSON records of an endpoint as a DataFrame, cached when enabled."""
+    if cache is not None:
+        records = cache.get(endpoint, ticker, period, limit, growth)
+        if records is not None:
+            ins.count('cache_hits')
+            return records
+        ins.count('cache_misses')
+    r = http_get(url)
+    ins.count('http_calls')
+    ins.count('http_bytes', len(r.content))
+    r.raise_for_status()
+    records = pd.DataFrame.from_dict(r.json())
+    ins.count('fmp_rows', len(records))
+    if cache is not None:
+        cache.put(endpoint, ticker, period, limit, growth, records)
+    return records
+
 # period = 'quarter' or 'annual'
+@ins.timed()
 def get_income_statement(ticker, limit, key, period, growth=False):
     """Get the Income Statement."""
-    URL = 'https://financialmodelingprep.com/api/v3/income-statement/'
+    endpoint = 'income-statement'
     if growth == True:
-        URL = 'https://financialmodelingprep.com/api/v3/income-statement-growth/'
+        endpoint = 'income-statement-growth'
+    URL = BASE_URL + endpoint + '/'
     try:
-        r = requests.get(
+        incomeStatement = get_records(
+            endpoint,
             '{}{}?period={}&limit={}&apikey={}'.format(URL,
                                                        ticker,
                                                        period,
                                                        limit,
-                                                       key))
-        incomeStatement = pd.DataFrame.from_dict(r.json()).transpose()
+                                                       key),
+            ticker, period, limit, growth).transpose()
         if growth == True:
             incomeStatement.columns = incomeStatement.loc['date']
         else:
@@ -26,22 +82,25 @@ def get_income_statement(ticker, limit, key, period, growth=False):
         return incomeStatement
     except requests.exceptions.HTTPError as e:
         # We want a 200 value
-        print('Requesting Income statement sheet ERROR: ', str(e))
+        ins.record_error('get_income_statement', ticker, e, 'Requesting Income statement sheet ERROR:')
 
 
+@ins.timed()
 def get_balance_sheet(ticker, limit, key, period,growth=False):
     """Get the Balance sheet."""
-    URL = 'https://financialmodelingprep.com/api/v3/balance-sheet-statement/'
+    endpoint = 'balance-sheet-statement'
     if growth == True:
-        URL = 'https://financialmodelingprep.com/api/v3/balance-sheet-statement-growth/'
+        endpoint = 'balance-sheet-statement-growth'
+    URL = BASE_URL + endpoint + '/'
     try:
-        r = requests.get(
+        balanceSheet = get_records(
+            endpoint,
             '{}{}?period={}&?limit={}&apikey={}'.format(URL,
                                                         ticker,
                                                         period,
                                                         limit,
-                                                        key))
-        balanceSheet = pd.DataFrame.from_dict(r.json()).transpose()
+                                                        key),
+            ticker, period, limit, growth).transpose()
         if growth == True:
             balanceSheet.columns = balanceSheet.loc['date']
         else:
@@ -49,44 +108,49 @@ def get_balance_sheet(ticker, limit, key, period,growth=False):
         return balanceSheet
     except requests.exceptions.HTTPError as e:
         # We want a 200 value
-        print('Requesting Balance sheet statement ERROR: ', str(e))
+        ins.record_error('get_balance_sheet', ticker, e, 'Requesting Balance sheet statement ERROR:')
 
 
+@ins.timed()
 def get_cash_flow_statement(ticker, limit, key, period, growth=False):
     """Get the Cash flow statements."""
-    URL = 'https://financialmodelingprep.com/api/v3/cash-flow-statement/'
+    endpoint = 'cash-flow-statement'
     if growth == True:
-        URL = 'https://financialmodelingprep.com/api/v3/cash-flow-statement-growth/'
+        endpoint = 'cash-flow-statement-growth'
+    URL = BASE_URL + endpoint + '/'
     try:
-        r = requests.get(
+        cashFlow = get_records(
+            endpoint,
             '{}{}?period={}&?limit={}&apikey={}'.format(URL,
                                                         ticker,
                                                         period,
                                                         limit,
-                                                        key))
-        cashFlow = pd.DataFrame.from_dict(r.json()).transpose()
+                                                        key),
+            ticker, period, limit, growth).transpose()
         if growth == True:
             cashFlow.columns = cashFlow.loc['date']
         else:
             cashFlow.columns = cashFlow.loc['fillingDate']
         return cashFlow
     except requests.exceptions.HTTPError as e:
-        print('Requesting Cash flow statement ERROR: ', str(e))
+        ins.record_error('get_cash_flow_statement', ticker, e, 'Requesting Cash flow statement ERROR:')
 
+@ins.timed()
 def get_financial_growth(ticker, limit, key):
     """Get the Cash flow statements."""
-    URL = 'https://financialmodelingprep.com/api/v3/financial-growth/'
+    URL = BASE_URL + 'financial-growth/'
     try:
-        r = requests.get(
+        fgrowth = get_records(
+            'financial-growth',
             '{}{}?limit={}&apikey={}'.format(URL,
                                    ticker,
                                    limit,
-                                   key))
-        fgrowth = pd.DataFrame.from_dict(r.json()).transpose()
+                                   key),
+            ticker, limit=limit).transpose()
         fgrowth.columns = fgrowth.loc['date']
         return fgrowth
     except requests.exceptions.HTTPError as e:
-        print('Requesting financial growth ERROR: ', str(e))
+        ins.record_error('get_financial_growth', ticker, e, 'Requesting financial growth ERROR:')
         
 # def get_financial_ratios(ticker, limit, key, period):
 #     """Get financial ratios."""
@@ -104,79 +168,87 @@ def get_financial_growth(ticker, limit, key):
 #     except requests.exceptions.HTTPError as e:
 #         print('Requesting financial ratios ERROR: ', str(e))
 
+@ins.timed()
 def get_financial_ratios(ticker, limit, key, period):
     """Period is ttm | annual | quarter."""
-    URL = 'https://financialmodelingprep.com/api/v3/'
+    URL = BASE_URL
     if period == "ttm":
         try:
-            r = requests.get(
+            fr = get_records(
+                'ratios-ttm',
                 '{}/ratios-ttm/{}?{}&apikey={}'.format(URL,
                                                        ticker,
                                                        period,
-                                                       key))
-            fr = pd.DataFrame.from_dict(r.json()).transpose()
+                                                       key),
+                ticker, period).transpose()
             fr.columns = [ticker + " TTM Ratios"]
             return fr
         except requests.exceptions.HTTPError as e:
-            print('Requesting Financial ratios ERROR(1): ', str(e))
+            ins.record_error('get_financial_ratios', ticker, e, 'Requesting Financial ratios ERROR(1):')
     elif period == "annual" or period == "quarter":
         try:
-            r = requests.get(
+            fr = get_records(
+                'ratios',
                 '{}ratios/{}?period={}&?limit={}&apikey={}'.format(URL,
                                                                    ticker,
                                                                    period,
                                                                    limit,
-                                                                   key))
-            fr = pd.DataFrame.from_dict(r.json()).transpose()
+                                                                   key),
+                ticker, period, limit).transpose()
             fr.columns = fr.iloc[1]
             return fr[2:]
         except requests.exceptions.HTTPError as e:
-            print('Requesting Financial ratios ERROR(2): ', str(e))
+            ins.record_error('get_financial_ratios', ticker, e, 'Requesting Financial ratios ERROR(2):')
     else:
-        print('ERROR: Define the period you want: ttm | annual | quarter')
+        ins.record_error('get_financial_ratios', ticker, ValueError('Define the period you want: ttm | annual | quarter'), 'ERROR:')
         return None
 
+@ins.timed()
 def get_key_metrics(ticker, limit, key, period):
     """Period is ttm | annual | quarter."""
-    URL = 'https://financialmodelingprep.com/api/v3/'
+    URL = BASE_URL
     if period == "ttm":
         try:
-            r = requests.get(
-                '{}key-metrics-ttm/{}?apikey={}'.format(URL, ticker, key))
-            km = pd.DataFrame.from_dict(r.json()).transpose()
+            km = get_records(
+                'key-metrics-ttm',
+                '{}key-metrics-ttm/{}?apikey={}'.format(URL, ticker, key),
+                ticker, period).transpose()
             km.columns = [ticker + " TTM Ratios"]
             return km
         except requests.exceptions.HTTPError as e:
-            print('Requesting Key Metrics ERROR(1): ', str(e))
+            ins.record_error('get_key_metrics', ticker, e, 'Requesting Key Metrics ERROR(1):')
     elif period == "annual" or period == "quarter":
         try:
-            r = requests.get(
+            km = get_records(
+                'key-metrics',
                 '{}key-metrics/{}?period={}&?limit={}&apikey={}'.format(URL,
                                                                         ticker,
                                                                         period,
                                                                         limit,
-                                                                        key))
-            km = pd.DataFrame.from_dict(r.json()).transpose()
+                                                                        key),
+                ticker, period, limit).transpose()
             km.columns = km.iloc[1]
             return km[2:]
         except requests.exceptions.HTTPError as e:
-            print('Requesting Key Metrcs ERROR(2): ', str(e))
+            ins.record_error('get_key_metrics', ticker, e, 'Requesting Key Metrcs ERROR(2):')
     else:
-        print('ERROR: Define the period you want: ttm | annual | quarter')
+        ins.record_error('get_key_metrics', ticker, ValueError('Define the period you want: ttm | annual | quarter'), 'ERROR:')
         return None
 
+@ins.timed()
 def get_enterprise_value(ticker, rate, key, period):
     """Period is annual or quarter. The rate is the number of days."""
-    URL = 'https://financialmodelingprep.com/api/v3/enterprise-values/'
+    URL = BASE_URL + 'enterprise-values/'
     try:
-        r = requests.get('{}{}?period={}&limit={}&apikey={}'.format(URL,
-                                                                    ticker,
-                                                                    period,
-                                                                    rate,
-                                                                    key))
-        return pd.DataFrame.from_dict(r.json())
+        return get_records('enterprise-values',
+                           '{}{}?period={}&limit={}&apikey={}'.format(URL,
+                                                                      ticker,
+                                                                      period,
+                                                                      rate,
+                                                                      key),
+                           ticker, period, rate)
     except requests.exceptions.HTTPError as e:
-        print('Requesting Enterprise Value ERROR: ', str(e))
+        ins.record_error('get_enterprise_value', ticker, e, 'Requesting Enterprise Value ERROR:')
         
 # def sales_by_product(ticker, limit, key, period):
 #     """Get sales by product segments."""
@@ -208,51 +280,58 @@ def get_enterprise_value(ticker, rate, key, period):
 #         print('Requesting sales by geographic ERROR: ', str(e))
         
         
+@ins.timed()
 def get_market_capital(ticker, key):
-    URL = 'https://financialmodelingprep.com/api/v3/market-capitalization/'
+    URL = BASE_URL + 'market-capitalization/'
     try:
-        r = requests.get(
+        r = http_get(
             '{}{}?apikey={}'.format(URL,
                                     ticker,
                                     key))
+        ins.count('http_calls')
         # mcap = pd.DataFrame.from_dict(r.json()).transpose()
         return r.json()[0]['marketCap']
     except requests.exceptions.HTTPError as e:
-        print('Requesting Market capitalization ERROR: ', str(e))
+        ins.record_error('get_market_capital', ticker, e, 'Requesting Market capitalization ERROR:')
 
 
+@ins.timed()
 def get_full_financial_statement_as_reported(ticker, key, period):
-    URL = 'https://financialmodelingprep.com/api/v3/financial-statement-full-as-reported/'
+    URL = BASE_URL + 'financial-statement-full-as-reported/'
     try:
-        r = requests.get(
+        r = http_get(
             '{}{}?period={}&apikey={}'.format(URL,
                                               ticker,
                                               period,
                                               key))
+        ins.count('http_calls')
         full_statement = pd.DataFrame.from_dict(r.json()).transpose()
         # full_statement.columns = full_statement.loc['fillingDate']
         return full_statement
     except requests.exceptions.HTTPError as e:
-        print('Requesting full financial statement ERROR: ', str(e))
+        ins.record_error('get_full_financial_statement_as_reported', ticker, e, 'Requesting full financial statement ERROR:')
 
         
+@ins.timed()
 def get_quote(ticker, key):
     """Getting the current quote of the company."""
-    URL = 'https://financialmodelingprep.com/api/v3/quote/'
+    URL = BASE_URL + 'quote/'
     try:
-        r = requests.get('{}{}?apikey={}'.format(URL,
-                                                 ticker,
-                                                 key))
-        quote = pd.DataFrame.from_dict(r.json()).transpose()
+        quote = get_records('quote',
+                            '{}{}?apikey={}'.format(URL,
+                                                    ticker,
+                                                    key),
+                            ticker).transpose()
         return(quote)
     except requests.exceptions.HTTPError as e:
-        print('Requesting quote estimate ERROR: ', str(e))
+        ins.record_error('get_quote', ticker, e, 'Requesting quote estimate ERROR:')
 
 
+@ins.timed()
 def get_industry_multiples():
     """Getting the Industry Multiples value from NYU. """
     URL = 'http://pages.stern.nyu.edu/~adamodar/New_Home_Page/datafile/vebitda.html'
-    html = requests.get(URL).content
+    html = http_get(URL).content
     df_list = pd.read_html(html)
     df = df_list[-1]
     df.columns = df.iloc[1]
@@ -283,79 +362,94 @@ def restoredata(limited_data, growth_data):
     return full_data
 
 
-def reconstruct_BV(ShE, WASHO, ShEpsh_g_3Y):
-    try:
-        ShEpsh = ShE / WASHO.tail(5).values # ShE limited to 5Y, WASHO is unlimited
-        d_ShEpsh = ShEpsh.pct_change() 
-
-        # uses 3Y growth data which is fully available
-        constant_G5 = ShEpsh_g_3Y[-1]
-        constant_G4 = ShEpsh_g_3Y[-2]
-        constant_G3 = ShEpsh_g_3Y[-3]
+# Status codes of reconstruct_BV_panel
+BV_OK, BV_SHORT_HISTORY, BV_BAD_INPUT = 0, 1, 2
+BV_STATUS = {BV_OK: 'ok',
+             BV_SHORT_HISTORY: 'fewer than 5 years of 3Y equity per share growth',
+             BV_BAD_INPUT: 'non-finite growth rates (zero or missing equity or shares)'}
 
-        # using gt=5, index -1 --> get g2
-        X = (1+constant_G4)/(1+constant_G5)
-        g2 = X * (1+d_ShEpsh[-1]) - 1
 
-        # using gt=4, index -2 --> g1
-        Y = (1+constant_G3)/(1+constant_G4)
-        g1 = Y * (1+d_ShEpsh[-2]) - 1
+def reconstruct_BV_panel(ShE, WASHO, ShEpsh_g_3Y):
+    """Reconstruct past Book Value of Equity for many tickers at once.
 
-        # deduce g3 using g1 and g2
-        g3 = (1+constant_G3)/((1+g1)*(1+g2)) - 1
+    Inputs are (tickers x years) float arrays on one right-aligned year axis
+    (latest year last, missing early years as NaN): ShE needs the last 3 years,
+    WASHO and the 3Y per-share equity growth cover the history to rebuild.
+    Returns (constructed_ShE, status) with status BV_OK, BV_SHORT_HISTORY or BV_BAD_INPUT.
+    """
+    ShE = np.atleast_2d(np.asarray(ShE, dtype=float))
+    WASHO = np.atleast_2d(np.asarray(WASHO, dtype=float))
+    G = np.atleast_2d(np.asarray(ShEpsh_g_3Y, dtype=float))
+    n_years = G.shape[1]
 
-        # deduce g4 using g2 and g3
-        g4 = (1+constant_G4)/((1+g2)*(1+g3)) - 1
+    status = np.full(len(G), BV_OK, dtype=np.int8)
+    status[(n_years < 5) | np.isnan(G[:, -5:]).any(axis=1)] = BV_SHORT_HISTORY
 
-        # deduce g5 using g3 and g4
-        g5 = (1+constant_G5)/((1+g3)*(1+g4)) - 1
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ShEpsh = ShE / WASHO
+        d_ShEpsh_1 = ShEpsh[:, -1] / ShEpsh[:, -2] - 1
+        d_ShEpsh_2 = ShEpsh[:, -2] / ShEpsh[:, -3] - 1
 
-        # build DF for ShEpsh_g_1Y
-        ShEpsh_g_1Y = pd.DataFrame(['NaN'] * len(ShEpsh_g_3Y.index[:-5]))
-        ShEpsh_g_1Y.index = ShEpsh_g_3Y.index[:-5] #ShEpsh
-        ShEpsh_g_1Y = ShEpsh_g_1Y.rename(columns={0:'d_ShEpsh'})
-
-        # Will be added to ShEpsh_g_1Y after ShEpsh_g_1Y is filled
-        add_df = pd.DataFrame([g1,g2,g3,g4,g5],index = ShEpsh_g_3Y.index[-5:])
-        add_df = add_df.rename(columns={0:'d_ShEpsh'})
-        ShEpsh_g_1Y = pd.concat([ShEpsh_g_1Y, add_df], axis=0)
-
-        # to get: ShEpsh_g_1Y index = -6
-        # use ShEpsh_g_3Y index -3, -2; ShEpsh_g_1Y index = -3
-
-        for idx in range(len(ShEpsh_g_1Y)-5): # fill from 6th from the last to the first data
-            constant_Gt = ShEpsh_g_3Y[-(3+idx)]
-            constant_Gt_L1 = ShEpsh_g_3Y[-(4+idx)]
-            gt = ShEpsh_g_1Y.iloc[-(3+idx)]
-
-            X = (1+constant_Gt_L1)/(1+constant_Gt)
-            gfill = X * (1+gt) - 1
+        # uses 3Y growth data which is fully available
+        constant_G5, constant_G4, constant_G3 = G[:, -1], G[:, -2], G[:, -3]
 
-            ShEpsh_g_1Y.iloc[-(idx+6)] = gfill # start from 6th from the last and fill data
+        # last five 1Y growth rates, same derivation as reconstruct_BV
+        g2 = (1+constant_G4)/(1+constant_G5) * (1+d_ShEpsh_1) - 1
+        g1 = (1+constant_G3)/(1+constant_G4) * (1+d_ShEpsh_2) - 1
+        g3 = (1+constant_G3)/((1+g1)*(1+g2)) - 1
+        g4 = (1+constant_G4)/((1+g2)*(1+g3)) - 1
+        g5 = (1+constant_G5)/((1+g3)*(1+g4)) - 1
 
-        rst_ShEpsh = restoredata(ShEpsh,ShEpsh_g_1Y).rename(columns={'d_ShEpsh': 'ShEpsh'})
-    except:
-        print('error occurred during Past Book Value of Equity calculation')
-    
-    try:
-        if len(rst_ShEpsh) < len(WASHO):
-            rst_start = rst_ShEpsh.index[0]
-            # WASHO_ = WASHO.loc[rst_start:]
-            WASHO_ = WASHO.iloc[-len(rst_ShEpsh):]
-            WASHO_ = equalize_date(WASHO_, rst_ShEpsh['ShEpsh'], 0)
-            constructed_ShE = rst_ShEpsh['ShEpsh'] * WASHO_ # ShE
-        else:
-            WASHO_start = WASHO.index[0]
-            # rst_ShEpsh_ = rst_ShEpsh.loc[WASHO_start:]
-            rst_ShEpsh_ = rst_ShEpsh.iloc[-len(WASHO):]
-            rst_ShEpsh_ = equalize_date(rst_ShEpsh, WASHO, 0)
-            constructed_ShE = rst_ShEpsh_['ShEpsh'] * WASHO # ShE
-    except: 
-        print('error occurred during Book Value Equity per share calculation')
-    
-    return constructed_ShE
+        g = np.full(G.shape, np.nan)
+        g[:, -5:] = np.column_stack([g1, g2, g3, g4, g5])
+
+        # backward fill: (1+g[j]) = (1+g[j+3]) * (1+G[j+2])/(1+G[j+3])
+        # three interleaved chains anchored at g1, g2 and g3, each one cumprod
+        ratio = (1 + G[:, 2:-1]) / (1 + G[:, 3:])
+        for anchor in range(n_years-5, n_years-2):
+            steps = np.arange(anchor-3, -1, -3)
+            if len(steps):
+                g[:, steps] = (1 + g[:, anchor:anchor+1]) * np.cumprod(ratio[:, steps], axis=1) - 1
+
+        # restore per-share equity backwards from the last observation (see restoredata)
+        growth = np.cumprod((1 + g[:, :0:-1]), axis=1)[:, ::-1]
+        growth = np.column_stack([growth, np.ones(len(G))])
+        rst_ShEpsh = ShEpsh[:, -1:] / growth
+
+    status[(status == BV_OK) & ~np.isfinite(g[:, -5:]).all(axis=1)] = BV_BAD_INPUT
+    constructed_ShE = rst_ShEpsh * WASHO
+    constructed_ShE[status != BV_OK] = np.nan
+    return constructed_ShE, status
+
+
+# Single ticker; a failed reconstruction is recorded and returns an all-NaN series,
+# or raises ValueError with strict=True (batch runs)
+@ins.timed()
+def reconstruct_BV(ShE, WASHO, ShEpsh_g_3Y, strict=False):
+    # Single ticker on a common right-aligned year axis
+    n_years = max(len(WASHO), len(ShEpsh_g_3Y))
+    panel = np.full((3, n_years), np.nan)
+    panel[0, n_years-len(ShE):] = ShE.astype(float).values # ShE limited to 5Y, WASHO is unlimited
+    panel[1, n_years-len(WASHO):] = WASHO.astype(float).values
+    panel[2, n_years-len(ShEpsh_g_3Y):] = ShEpsh_g_3Y.astype(float).values
+
+    constructed_ShE, status = reconstruct_BV_panel(panel[0], panel[1], panel[2])
+    if status[0] != BV_OK:
+        error = ValueError('status {}: {}'.format(status[0], BV_STATUS[status[0]]))
+        if strict:
+            raise error
+        ins.record_error('reconstruct_BV', getattr(ShE, 'name', None), error,
+                         'error occurred during Past Book Value of Equity calculation:')
+
+    # keep the dates of the shorter of the growth and share count histories
+    if len(ShEpsh_g_3Y) < len(WASHO):
+        index = ShEpsh_g_3Y.index
+    else:
+        index = WASHO.index
+    return pd.Series(constructed_ShE[0, -len(index):], index=index)
 
 
+@ins.timed()
 def get_allROE(BV, NI):
 #     BV_start = BV.index[0]
 #     NI_ = NI.loc[BV_start:]  
@@ -396,28 +490,41 @@ def get_GR(roe_data):
 def S_RIM_ROE_estimates(roe_data):
     # S-RIM estimate using past 5 years ROE data
     S_RIM_ROE_estimates = roe_data.copy()
+    S_RIM_ROE_estimates.iloc[:] = S_RIM_ROE_estimates_array(roe_data.values)
 
-    # integer weights from the start of data = 1 to end of data = N
-    weights = list(range(1,1+roe_data.count()))
-
-    # assign weights to past ROE observations
-    # (ROE * range(1,6)).cumsum().values / pd.Series(range(1,6)).cumsum()
-    for w in weights:
-        x = weights[:w]
-        if pd.isna(roe_data.iloc[0]):
-            estimates = sum(roe_data[1:w+1] * x)/sum(x)
-            # assign 1-period forward S-RIM estimates to t-1 period
-            S_RIM_ROE_estimates.iloc[w] = estimates
-        else:
-            estimates = sum(roe_data[0:w] * x)/sum(x)
-            # assign 1-period forward S-RIM estimates to t-1 period
-            S_RIM_ROE_estimates.iloc[w-1] = estimates
-    
     # Last estimate is the complete S-RIM estimate 
     return S_RIM_ROE_estimates # [-1]
 
 
+# Linearly weighted S-RIM ROE estimates with cumulative sums, O(n) per series
+# roe_data is 1-D or 2-D (many tickers or windows as rows, oldest period first)
+def S_RIM_ROE_estimates_array(roe_data):
+    roe = np.array(roe_data, dtype=float)
+    one_d = roe.ndim == 1
+    roe = np.atleast_2d(roe)
+    n = roe.shape[1]
+
+    # integer weights from the start of data = 1 to end of data = N
+    # (ROE * range(1,6)).cumsum().values / pd.Series(range(1,6)).cumsum()
+    weights = np.arange(1, n+1)
+    lead_nan = np.isnan(roe[:, :1])
+    count = (~np.isnan(roe)).sum(axis=1, keepdims=True)
+
+    # a leading NaN (e.g. average equity ROE) starts the weights at the next observation
+    base = np.where(lead_nan, np.roll(roe, -1, axis=1), roe)
+    estimates = np.cumsum(base * weights, axis=1) / np.cumsum(weights)
+
+    # assign 1-period forward S-RIM estimates to t-1 period
+    estimates = np.where(lead_nan, np.roll(estimates, 1, axis=1), estimates)
+    position = np.arange(n)
+    filled = (position >= lead_nan) & (position < count + lead_nan)
+    estimates = np.where(filled, estimates, roe)
+
+    return estimates[0] if one_d else estimates
+
+
 # S-RIM ROE_1 estimation
+@ins.timed()
 def S_RIM_ROE_Projection(ROE_data, ROE_ttm=None):
     ROE_data = ROE_data.copy()
     
@@ -434,13 +541,16 @@ def S_RIM_ROE_Projection(ROE_data, ROE_ttm=None):
     # Strictly rising or falling to determine criteria
     if (ROE_data[1:] > ROE_data.shift(1)[1:]).sum() == len(ROE_data[1:]):
         ROE_1 = ROE_data[-1]
-        print(f'rising: {ROE_1}')
+        ins.count('roe_regime.rising')
+        ins.log(f'rising: {ROE_1}')
     elif (ROE_data[1:] < ROE_data.shift(1)[1:]).sum() == len(ROE_data[1:]):
         ROE_1 = ROE_data[-1]
-        print(f'falling: {ROE_1}')
+        ins.count('roe_regime.falling')
+        ins.log(f'falling: {ROE_1}')
     else:
         ROE_1 = S_RIM_ROE_estimates(ROE_data)[-1]
-        print(f'sideways: {ROE_1}')
+        ins.count('roe_regime.sideways')
+        ins.log(f'sideways: {ROE_1}')
         
     ### OR
     
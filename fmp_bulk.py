@@ -0,0 +1,167 @@
+""" Concurrent bulk fetcher for Financial Modeling Prep data across a ticker universe.
+
+Runs the finance_scrapper getters on a thread pool over one pooled HTTP session,
+with a cap on in-flight requests and a token-bucket rate limit for the FMP plan quota.
+"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import finance_scrapper as fs
+import instrument as ins
+import providers
+
+# statuses retried by LimitedSession, each attempt taking its own rate-limit token
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` calls per second, bursting up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1, rate)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class LimitedSession(requests.Session):
+    """Session that takes a rate-limit token and an in-flight slot for every request.
+
+    429/5xx responses and connection errors are retried here rather than inside the
+    adapter, so every attempt goes through the token bucket and stays within quota.
+    """
+
+    def __init__(self, bucket, max_in_flight, retries=3, backoff=0.5):
+        super().__init__()
+        self.bucket = bucket
+        self.in_flight = threading.BoundedSemaphore(max_in_flight)
+        self.retries = retries
+        self.backoff = backoff
+        # pool sized to the in-flight cap so every worker keeps its connection alive
+        adapter = HTTPAdapter(pool_connections=max_in_flight, pool_maxsize=max_in_flight)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
+    def request(self, *args, **kwargs):
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            try:
+                with self.in_flight:
+                    r = super().request(*args, **kwargs)
+            except requests.exceptions.ConnectionError:
+                if attempt == self.retries:
+                    raise
+                wait = self.backoff * 2 ** attempt
+            else:
+                if r.status_code not in RETRY_STATUS or attempt == self.retries:
+                    return r
+                retry_after = r.headers.get('Retry-After', '')
+                wait = float(retry_after) if retry_after.isdigit() else self.backoff * 2 ** attempt
+                r.close()
+            ins.count('http_retries')
+            time.sleep(wait)
+
+
+# Statements used by the S-RIM notebook, called as fn(ticker, key, limit, period)
+SRIM_ENDPOINTS = {
+    'IS': lambda t, key, limit, period: fs.get_income_statement(t, limit, key, period),
+    'BS': lambda t, key, limit, period: fs.get_balance_sheet(t, limit, key, period),
+    'fgrowth': lambda t, key, limit, period: fs.get_financial_growth(t, limit, key),
+    'ratios': lambda t, key, limit, period: fs.get_financial_ratios(t, limit, key, 'annual'),
+    'ratios_ttm': lambda t, key, limit, period: fs.get_financial_ratios(t, limit, key, 'ttm'),
+    'quote': lambda t, key, limit, period: fs.get_quote(t, key),
+}
+
+
+def fetch_universe(tickers, key, limit=0, period='', endpoints=None,
+                   max_in_flight=8, calls_per_minute=300, burst=None):
+    """Fetch every endpoint for every ticker concurrently.
+
+    Returns ({ticker: {name: DataFrame}}, {(ticker, name): error message}).
+    calls_per_minute should match the FMP plan quota.
+    """
+    if endpoints is None:
+        endpoints = SRIM_ENDPOINTS
+    bucket = TokenBucket(calls_per_minute / 60, burst)
+    session = LimitedSession(bucket, max_in_flight)
+
+    results = {t: {} for t in tickers}
+    errors = {}
+
+    # only this run's jobs go through the limited session; fs.provider is left alone
+    source = providers.FMPProvider(session)
+
+    def job(ticker, name):
+        started = time.time()
+        try:
+            with fs.using(source):
+                results[ticker][name] = endpoints[name](ticker, key, limit, period)
+        except Exception as e:
+            results[ticker][name] = None
+            errors[(ticker, name)] = '{}: {}'.format(type(e).__name__, e)
+            return
+        # the getters record HTTP errors and return None instead of raising; the job
+        # runs on one thread, so that thread's error belongs to this ticker and endpoint
+        if results[ticker][name] is None:
+            errors[(ticker, name)] = ins.thread_error(since=started) or 'no data returned'
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+            futures = [pool.submit(job, t, name) for t in tickers for name in endpoints]
+            for f in futures:
+                f.result()
+    finally:
+        session.close()
+
+    return results, errors
+
+
+# Local stub of the FMP API for offline runs
+# respond(path, query) returns the JSON payload, e.g. path = '/api/v3/quote/AAPL',
+# or (status, payload) to answer with an HTTP error such as 401 or 429
+def serve_stub(respond, latency=0):
+    """Start a threaded local HTTP server. Returns (server, base_url); call server.shutdown() when done."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if latency:
+                time.sleep(latency)
+            out = respond(url.path, parse_qs(url.query))
+            status, payload = out if isinstance(out, tuple) else (200, out)
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = 'http://127.0.0.1:{}/api/v3/'.format(server.server_address[1])
+    return server, base_url
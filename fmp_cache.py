@@ -0,0 +1,123 @@
+""" Persistent on-disk cache for Financial Modeling Prep responses.
+
+Enable it for every finance_scrapper getter with:
+    import finance_scrapper as fs
+    import fmp_cache
+    fs.cache = fmp_cache.FMPCache('fmp_cache')
+"""
+import os
+import re
+import tempfile
+import time
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+import instrument as ins
+
+DAY = 24 * 60 * 60
+
+# Time-to-live per endpoint in seconds
+# statements only change when a new filing arrives, quotes and ttm data go stale fast
+DEFAULT_TTL = {
+    'income-statement': 30 * DAY,
+    'income-statement-growth': 30 * DAY,
+    'balance-sheet-statement': 30 * DAY,
+    'balance-sheet-statement-growth': 30 * DAY,
+    'cash-flow-statement': 30 * DAY,
+    'cash-flow-statement-growth': 30 * DAY,
+    'financial-growth': 30 * DAY,
+    'ratios': 30 * DAY,
+    'key-metrics': 30 * DAY,
+    'enterprise-values': 30 * DAY,
+    'ratios-ttm': DAY,
+    'key-metrics-ttm': DAY,
+    'quote': 15 * 60,
+}
+
+
+class FMPCache:
+    """Columnar (Feather or Parquet) response cache with per-endpoint TTL and an LRU size cap."""
+
+    def __init__(self, path='fmp_cache', ttl=None, max_bytes=512 * 2**20, fmt='feather'):
+        self.path = path
+        self.ttl = dict(DEFAULT_TTL)
+        if ttl is not None:
+            self.ttl.update(ttl)
+        self.max_bytes = max_bytes
+        self.fmt = fmt
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+
+    def file_path(self, endpoint, ticker, period='', limit='', growth=False):
+        key = '__'.join([endpoint, str(ticker), str(period), str(limit), str(int(bool(growth)))])
+        key = re.sub(r'[^A-Za-z0-9_.^=-]', '_', key)
+        return os.path.join(self.path, '{}.{}'.format(key, self.fmt))
+
+    def get(self, endpoint, ticker, period='', limit='', growth=False):
+        """Return the cached records, or None when missing or expired."""
+        path = self.file_path(endpoint, ticker, period, limit, growth)
+        try:
+            written = os.path.getmtime(path)
+        except OSError:
+            self.misses += 1
+            return None
+
+        now = time.time()
+        if now - written > self.ttl.get(endpoint, 30 * DAY):
+            os.remove(path)
+            self.misses += 1
+            return None
+
+        # memory-mapped read of the Arrow table; to_pandas() then builds the frame
+        if self.fmt == 'feather':
+            records = feather.read_table(path, memory_map=True).to_pandas()
+        else:
+            records = pq.read_table(path, memory_map=True).to_pandas()
+        # access time drives the LRU order, modification time stays the write time
+        os.utime(path, (now, written))
+        self.hits += 1
+        return records
+
+    def put(self, endpoint, ticker, period, limit, growth, records):
+        # empty results and FMP error payloads ({"Error Message": ...}) are not cached,
+        # so the next call asks again instead of serving them for the whole TTL
+        if len(records) == 0 or 'Error Message' in records.columns:
+            return
+        path = self.file_path(endpoint, ticker, period, limit, growth)
+        # one temp file per writer: concurrent puts of the same key must not share it
+        with tempfile.NamedTemporaryFile(dir=self.path, prefix=os.path.basename(path) + '.',
+                                         suffix='.tmp', delete=False) as f:
+            tmp = f.name
+        try:
+            if self.fmt == 'feather':
+                # uncompressed so reads can be memory-mapped
+                records.to_feather(tmp, compression='uncompressed')
+            else:
+                records.to_parquet(tmp, index=False)
+        except (TypeError, ValueError, ImportError) as e:
+            # mixed-type columns cannot be stored as columns, skip caching them
+            ins.record_error('fmp_cache.put', ticker, e, 'FMP cache write skipped for {} {}:'.format(endpoint, ticker))
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used files until the cache fits max_bytes."""
+        entries = []
+        for name in os.listdir(self.path):
+            if name.endswith('.' + self.fmt):
+                st = os.stat(os.path.join(self.path, name))
+                entries.append((st.st_atime, st.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.path, name))
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.path):
+            os.remove(os.path.join(self.path, name))
@@ -0,0 +1,150 @@
+""" Columnar ingestion of FMP statement payloads into long typed tables.
+
+JSON records (one or many tickers) and bulk CSV statement files are read column-wise
+into a single long table (ticker, date, field, value) with categorical ticker and
+field, datetime64 dates and float64 values. The (fields x dates) frames the notebooks
+build with `.iloc[8:-2].astype(float).iloc[:, ::-1]` are pivots of that table.
+"""
+import io
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import finance_scrapper as fs
+
+BULK_URL = 'https://financialmodelingprep.com/api/v4/'
+
+# Statement columns that are never fields (CSV reads cik and calendarYear as numbers)
+META_COLS = ['date', 'symbol', 'reportedCurrency', 'cik', 'fillingDate', 'acceptedDate',
+             'calendarYear', 'period', 'link', 'finalLink']
+
+# Date every long table is keyed by unless date_col says otherwise: the fiscal period
+# end, which statements, ratios and key metrics all carry ('fillingDate' only exists
+# on statements, so keying by it puts NI/BV and the ratios on different dates)
+DATE_COL = 'date'
+
+
+### Normalization
+# Long table from a frame of statement rows (one row per ticker and period)
+# Numeric columns other than META_COLS become fields; the key column is kept in attrs
+def normalize(frame, date_col=None, ticker_col='symbol'):
+    date_col = date_col or DATE_COL
+    fields = [c for c in frame.select_dtypes('number').columns if c not in META_COLS + [ticker_col, date_col]]
+    values = frame[fields].to_numpy(dtype=np.float64)
+    n_rows, n_fields = values.shape
+
+    tickers = pd.Categorical(frame[ticker_col])
+    long = pd.DataFrame({
+        'ticker': pd.Categorical.from_codes(np.repeat(tickers.codes, n_fields), tickers.categories),
+        'date': np.repeat(pd.to_datetime(frame[date_col]).to_numpy(), n_fields),
+        'field': pd.Categorical.from_codes(np.tile(np.arange(n_fields), n_rows), fields),
+        'value': values.ravel(),
+    })
+    long.attrs['date_col'] = date_col
+    return long
+
+
+def from_records(records, date_col=None):
+    """Long table from FMP JSON records: a list (rows carry 'symbol') or {ticker: list}."""
+    rows = records if not isinstance(records, dict) else [row for rows in records.values() for row in rows]
+    # string metadata is dropped while reading rather than materialized as object columns
+    keys = rows[0].keys() if rows else ()
+    skip = [c for c in META_COLS if c in keys and c not in ('symbol', 'date', 'fillingDate', date_col)]
+    frame = pd.DataFrame.from_records(rows, exclude=skip)
+    if isinstance(records, dict):
+        frame['symbol'] = np.repeat(list(records), [len(r) for r in records.values()])
+    return normalize(frame, date_col)
+
+
+def from_bulk_csv(source, date_col=None):
+    """Long table from a bulk statement CSV (path, or the response text)."""
+    if isinstance(source, str) and '\n' in source:
+        source = io.StringIO(source)
+    return normalize(pd.read_csv(source), date_col)
+
+
+### Views
+def wide(long, ticker):
+    """(fields x dates) float frame of one ticker, oldest date first."""
+    rows = long[long['ticker'] == ticker]
+    df = rows.pivot(index='field', columns='date', values='value')
+    return df.loc[df.index.isin(rows['field'].unique())]
+
+
+def panel(long, field):
+    """(tickers x dates) float frame of one field."""
+    rows = long[long['field'] == field]
+    return rows.pivot(index='ticker', columns='date', values='value')
+
+
+### Fetching
+def get_statements(tickers, key, endpoint='income-statement', period='annual', limit='', date_col=None):
+    """Statements of several tickers fetched through fs.http_get into one long table."""
+    records = {}
+    for ticker in tickers:
+        url = '{}{}/{}?period={}&limit={}&apikey={}'.format(fs.BASE_URL, endpoint, ticker, period, limit, key)
+        r = fs.http_get(url)
+        r.raise_for_status()
+        records[ticker] = r.json()
+    return from_records(records, date_col)
+
+
+# statement = 'income-statement', 'balance-sheet-statement' or 'cash-flow-statement'
+def get_bulk(statement, year, key, period='annual', date_col=None):
+    """One year of a statement for every ticker from FMP's bulk CSV endpoint."""
+    url = '{}{}-bulk?year={}&period={}&apikey={}'.format(BULK_URL, statement, year, period, key)
+    r = fs.http_get(url)
+    r.raise_for_status()
+    return from_bulk_csv(r.text, date_col)
+
+
+### Benchmark
+META = {'reportedCurrency': 'USD', 'cik': '0000320193', 'acceptedDate': '2022-10-27 18:01:14',
+        'calendarYear': '2022', 'period': 'FY'}
+
+
+def synthetic_records(n_tickers, n_years=10, n_fields=30, seed=0):
+    """{ticker: FMP style income statement records}, newest first."""
+    rng = np.random.default_rng(seed)
+    fields = ['field{}'.format(i) for i in range(n_fields)]
+    records = {}
+    for i in range(n_tickers):
+        ticker = 'T{}'.format(i)
+        rows = []
+        for year in range(2022, 2022 - n_years, -1):
+            row = {'date': '{}-09-24'.format(year), 'symbol': ticker, **META,
+                   'fillingDate': '{}-10-28'.format(year)}
+            row.update(zip(fields, rng.normal(1e9, 1e8, n_fields).tolist()))
+            row.update({'link': 'https://www.sec.gov/', 'finalLink': 'https://www.sec.gov/'})
+            rows.append(row)
+        records[ticker] = rows
+    return records
+
+
+# The current path: one transposed object frame per ticker, then the notebook's cast
+def ingest_transposed(records):
+    out = {}
+    for ticker, rows in records.items():
+        df = pd.DataFrame.from_dict(rows).transpose()
+        df.columns = df.loc['fillingDate']
+        out[ticker] = df.iloc[8:-2].astype(float).iloc[:, ::-1]
+    return out
+
+
+def benchmark_ingest(n_tickers=500, n_years=10, n_fields=30, seed=0):
+    """Wall time and peak traced memory of the transposed path vs the long table."""
+    records = synthetic_records(n_tickers, n_years, n_fields, seed)
+    results = {}
+    for name, fn in [('transposed', ingest_transposed), ('long', from_records)]:
+        tracemalloc.start()
+        start = time.perf_counter()
+        out = fn(records)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        size = (out.memory_usage(deep=True).sum() if isinstance(out, pd.DataFrame)
+                else sum(df.memory_usage(deep=True).sum() + df.columns.memory_usage(deep=True) for df in out.values()))
+        results[name] = {'seconds': elapsed, 'peak_MB': peak / 1e6, 'result_MB': size / 1e6}
+    return pd.DataFrame(results).T
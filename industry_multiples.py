@@ -0,0 +1,145 @@
+""" Cached industry multiples (Damodaran EV/EBITDA dataset) and batch multiples valuation.
+
+The page is parsed once into a float64 table indexed by a categorical industry name
+and kept in a local Parquet file, re-downloaded only when older than `max_age`.
+multiples_valuation() applies an industry multiple to every ticker of a universe:
+
+    implied EV = multiple * base (e.g. EBITDA), equity = EV - net debt, value = equity / shares
+"""
+import io
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import finance_scrapper as fs
+
+URL = 'http://pages.stern.nyu.edu/~adamodar/New_Home_Page/datafile/vebitda.html'
+CACHE_PATH = 'industry_multiples.parquet'
+# Damodaran updates the datasets once a year in January; a weekly check is plenty
+MAX_AGE = 7 * 86400
+
+# base metric of each EV multiple in the universe table
+MULTIPLE_BASES = {'EV/EBITDA': 'EBITDA',
+                  'EV/EBIT': 'EBIT',
+                  'EV/EBITDAR&D': 'EBITDAR&D',
+                  'EV/Sales': 'Revenue'}
+
+
+### Dataset
+def to_float(col):
+    s = col.astype('string').str.strip().str.replace(r'[$,]', '', regex=True)
+    pct = s.str.endswith('%').fillna(False).to_numpy(dtype=bool)
+    values = pd.to_numeric(s.str.rstrip('%'), errors='coerce').astype('float64')
+    return values.where(~pct, values / 100)
+
+
+def parse_multiples(html):
+    """Typed table from the vebitda page: float columns, categorical 'Industry Name' index.
+
+    Column groups on the page ('Only positive EBITDA firms', 'All firms') repeat the
+    same multiples; repeated names get the group appended, e.g. 'EV/EBITDA (All firms)'.
+    """
+    raw = pd.read_html(io.StringIO(html) if isinstance(html, str) else io.BytesIO(html), header=None)[-1]
+    raw = raw.astype('string')
+    header = raw.index[raw.iloc[:, 0].str.strip() == 'Industry Name'][0]
+    names = raw.loc[header].str.strip().tolist()
+    groups = (raw.loc[:header - 1].ffill(axis=1).iloc[-1].str.strip().tolist()
+              if header > raw.index[0] else [None] * len(names))
+
+    columns, seen = [], set()
+    for name, group in zip(names, groups):
+        columns.append(name if name not in seen else '{} ({})'.format(name, group))
+        seen.add(name)
+
+    body = raw.loc[header + 1:].set_axis(columns, axis=1)
+    body = body[body['Industry Name'].notna()]
+    df = pd.DataFrame({c: to_float(body[c]) for c in columns[1:]})
+    df.index = pd.CategoricalIndex(body['Industry Name'].str.strip(), name='Industry Name')
+    return df
+
+
+def download_multiples(url=URL):
+    r = fs.http_get(url)
+    r.raise_for_status()
+    return parse_multiples(r.content)
+
+
+def load_multiples(path=CACHE_PATH, max_age=MAX_AGE, refresh=False, url=URL):
+    """The multiples table from the local cache, downloaded again once older than max_age seconds."""
+    fresh = os.path.exists(path) and time.time() - os.path.getmtime(path) < max_age
+    if fresh and not refresh:
+        df = pd.read_parquet(path)
+        df.index = pd.CategoricalIndex(df.index, name='Industry Name')
+        return df
+    df = download_multiples(url)
+    tmp = path + '.tmp'
+    df.to_parquet(tmp)
+    os.replace(tmp, path)
+    return df
+
+
+def lookup(multiples, industries, columns=None):
+    """Rows of `multiples` for a vector of industry names (NaN where unknown), in order."""
+    pos = multiples.index.get_indexer(pd.Index(industries))
+    values = multiples.to_numpy(dtype=float) if columns is None else multiples[columns].to_numpy(dtype=float)
+    out = values[pos]
+    out[pos < 0] = np.nan
+    return out
+
+
+### Valuation
+# universe: ticker-indexed frame with 'industry', 'net_debt', 'shares' and the base columns
+def multiples_valuation(universe, multiples, multiple=('EV/EBITDA',), price=None):
+    """Implied EV, equity value and value per share for every ticker and multiple."""
+    multiple = [multiple] if isinstance(multiple, str) else list(multiple)
+    M = lookup(multiples, universe['industry'], multiple)                  # (tickers x multiples)
+    base = universe[[MULTIPLE_BASES[m] for m in multiple]].to_numpy(dtype=float)
+    net_debt = universe['net_debt'].to_numpy(dtype=float)[:, None]
+    shares = universe['shares'].to_numpy(dtype=float)[:, None]
+
+    EV = M * base
+    equity = EV - net_debt
+    out = {}
+    for j, m in enumerate(multiple):
+        out['{} multiple'.format(m)] = M[:, j]
+        out['{} implied EV'.format(m)] = EV[:, j]
+        out['{} value_psh'.format(m)] = equity[:, j] / shares[:, 0]
+    df = pd.DataFrame(out, index=universe.index)
+    if price is not None:
+        price = pd.Series(price).reindex(universe.index).to_numpy(dtype=float)
+        for m in multiple:
+            df['{} upside'.format(m)] = df['{} value_psh'.format(m)].to_numpy() / price - 1
+    return df
+
+
+# FMP income statement line of each base (EBITDAR&D adds back R&D expenses)
+STATEMENT_BASES = {'EBITDA': ['ebitda'],
+                   'EBIT': ['operatingIncome'],
+                   'EBITDAR&D': ['ebitda', 'researchAndDevelopmentExpenses'],
+                   'Revenue': ['revenue']}
+
+
+# Latest bases, net debt, share count and price per ticker from get_income_statement
+# (annual, transposed) and get_enterprise_value (records) results
+def universe_inputs(enterprise_values, income_statements, industries):
+    rows = {}
+    for ticker, ev in enterprise_values.items():
+        latest = ev.sort_values('date').iloc[-1]
+        row = {'industry': industries.get(ticker)}
+        IS = income_statements.get(ticker)
+        if IS is not None and 'date' in IS.index:
+            # columns are filings; the newest by fiscal date, whatever order FMP returned
+            newest = IS.iloc[:, pd.to_datetime(IS.loc['date']).to_numpy().argmax()]
+            for base, lines in STATEMENT_BASES.items():
+                row[base] = sum(float(pd.to_numeric(newest.get(line, np.nan), errors='coerce')) for line in lines)
+        row.update({'net_debt': latest['addTotalDebt'] - latest['minusCashAndCashEquivalents'],
+                    'shares': latest['numberOfShares'],
+                    'price': latest['stockPrice']})
+        rows[ticker] = row
+    df = pd.DataFrame.from_dict(rows, orient='index')
+    df = df.reindex(columns=['industry'] + list(STATEMENT_BASES) + ['net_debt', 'shares', 'price'])
+    df[list(STATEMENT_BASES)] = df[list(STATEMENT_BASES)].astype(float)
+    df.index.name = 'ticker'
+    return df
@@ -0,0 +1,202 @@
+""" Stage timers, counters and structured error records for the valuation pipeline.
+
+One process-wide recorder collects:
+    timings  per stage: calls, total, min and max seconds (timer() / timed())
+    counters e.g. http_calls, http_bytes, fmp_rows, yf_rows, cache_hits (count())
+    errors   one record per failure with stage, ticker and message (record_error())
+report() / save_report() export everything as JSON and summary() as a table.
+profile() optionally adds cProfile and tracemalloc results to the report.
+
+Updates are locked, so thread pools (fmp_bulk) can record concurrently. Process pool
+workers record inside capture() and return the result, which the parent merge()s.
+"""
+import cProfile
+import functools
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+
+import pandas as pd
+
+# print error messages as they are recorded (the modules used to print them)
+echo = True
+
+timings = {}
+counters = defaultdict(int)
+errors = []
+profiles = {}
+_lock = threading.Lock()
+# latest error record of each thread
+_local = threading.local()
+
+
+def reset():
+    with _lock:
+        timings.clear()
+        counters.clear()
+        errors.clear()
+        profiles.clear()
+
+
+def add_timing(name, seconds):
+    with _lock:
+        t = timings.setdefault(name, {'calls': 0, 'total': 0.0, 'min': float('inf'), 'max': 0.0})
+        t['calls'] += 1
+        t['total'] += seconds
+        t['min'] = min(t['min'], seconds)
+        t['max'] = max(t['max'], seconds)
+
+
+@contextmanager
+def timer(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(name, time.perf_counter() - start)
+
+
+def timed(name=None):
+    """Decorator timing every call under `name` (default module.function)."""
+    def decorator(fn):
+        stage = name or '{}.{}'.format(fn.__module__, fn.__name__)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, n=1):
+    with _lock:
+        counters[name] += n
+
+
+def record_error(stage, ticker, error, message=None):
+    """Keep a structured error record; echo `message` + error like the old prints."""
+    record = {'time': time.time(),
+              'stage': stage,
+              'ticker': ticker,
+              'error': type(error).__name__ if isinstance(error, BaseException) else 'Error',
+              'message': str(error)}
+    with _lock:
+        errors.append(record)
+    _local.error = record
+    if echo:
+        print(message if message is not None else '[{}] {} error:'.format(ticker, stage), str(error))
+
+
+def log(message):
+    """Progress and diagnostic messages, printed only while echo is on."""
+    if echo:
+        print(message)
+
+
+def describe(e):
+    return '{} {}: {}'.format(e['stage'], e['error'], e['message'])
+
+
+def last_error(ticker, since=0):
+    """'stage Error: message' of the latest error recorded for `ticker` since `since`, or None."""
+    for e in reversed(errors):
+        if e['time'] < since:
+            break
+        if e['ticker'] == ticker:
+            return describe(e)
+    return None
+
+
+def thread_error(since=0):
+    """Like last_error, for the latest error recorded by the calling thread (any ticker)."""
+    e = getattr(_local, 'error', None)
+    return describe(e) if e is not None and e['time'] >= since else None
+
+
+def _state():
+    return {'timings': {k: dict(v) for k, v in timings.items()},
+            'counters': dict(counters),
+            'errors': list(errors)}
+
+
+@contextmanager
+def capture():
+    """Record a block on its own: yields a dict that receives the block's timings,
+    counters and errors when it ends, and the records from before are restored."""
+    with _lock:
+        saved = _state()
+        timings.clear()
+        counters.clear()
+        errors.clear()
+    out = {}
+    try:
+        yield out
+    finally:
+        with _lock:
+            out.update(_state())
+            timings.clear()
+            timings.update(saved['timings'])
+            counters.clear()
+            counters.update(saved['counters'])
+            errors[:] = saved['errors']
+
+
+def merge(captured):
+    """Add records captured elsewhere (e.g. returned by a process pool worker)."""
+    with _lock:
+        for name, c in captured.get('timings', {}).items():
+            t = timings.setdefault(name, {'calls': 0, 'total': 0.0, 'min': float('inf'), 'max': 0.0})
+            t['calls'] += c['calls']
+            t['total'] += c['total']
+            t['min'] = min(t['min'], c['min'])
+            t['max'] = max(t['max'], c['max'])
+        for name, n in captured.get('counters', {}).items():
+            counters[name] += n
+        errors.extend(captured.get('errors', []))
+
+
+@contextmanager
+def profile(name='run', memory=False, top=20):
+    """cProfile (and tracemalloc peak and top allocations if memory=True) of a block."""
+    prof = cProfile.Profile()
+    if memory:
+        tracemalloc.start()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        out = io.StringIO()
+        pstats.Stats(prof, stream=out).sort_stats('cumulative').print_stats(top)
+        profiles[name] = {'cprofile': out.getvalue()}
+        if memory:
+            snapshot = tracemalloc.take_snapshot()
+            profiles[name]['tracemalloc_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            profiles[name]['tracemalloc_top'] = [str(s) for s in snapshot.statistics('lineno')[:top]]
+            tracemalloc.stop()
+
+
+def summary():
+    """Per-stage timing table, slowest total first."""
+    df = pd.DataFrame.from_dict(timings, orient='index', columns=['calls', 'total', 'min', 'max'])
+    df['mean'] = df['total'] / df['calls']
+    df.index.name = 'stage'
+    return df.sort_values('total', ascending=False)
+
+
+def report():
+    return {'timings': timings,
+            'counters': dict(counters),
+            'errors': errors,
+            'profiles': profiles}
+
+
+def save_report(path):
+    with open(path, 'w') as f:
+        json.dump(report(), f, indent=2, default=str)
@@ -0,0 +1,260 @@
+""" Nightly S-RIM valuation of a ticker universe over a process pool, with checkpoints.
+
+The universe is cut into shards of `shard_size` tickers. Each shard runs in a worker
+and writes <checkpoint_dir>/shard_<n>.json atomically (tmp file + os.replace) when it
+finishes, so an interrupted run started again with the same tickers and shard size
+skips the shards already on disk. A failing ticker becomes an error record
+(ticker, stage, error, message) instead of stopping its shard.
+
+Per ticker, as in the S-RIM notebook:
+    statements -> reconstruct_BV -> get_allROE -> S_RIM_ROE_Projection -> get_beta_yf -> valuation
+
+    python nightly_runner.py tickers.txt --key <FMP key> --processes 4
+"""
+import argparse
+import contextlib
+import datetime as dt
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+import CAPM_fn as capm
+import finance_scrapper as fs
+import instrument as ins
+from srim_panel import RIM_valuation_single_stage
+
+MANIFEST = 'manifest.json'
+
+
+### Per ticker pipeline
+def fetch(getter, ticker, *args):
+    # the fs getters record HTTP errors and return None; the recorded error is the detail
+    started = time.time()
+    data = getter(ticker, *args)
+    if data is None:
+        raise LookupError(ins.last_error(ticker, since=started) or '{} returned no data'.format(getter.__name__))
+    return data
+
+
+# context: key, rf, market_premium, w, limit, years and interval of the beta prices,
+# optionally 'prices' (Adj Close with '^GSPC') to skip the per ticker download
+def value_ticker(ticker, context, stage):
+    """Single stage S-RIM value of one ticker. stage['name'] tracks the running step."""
+    key, limit = context['key'], context.get('limit', 0)
+
+    stage['name'] = 'statements'
+    IS_df = fetch(fs.get_income_statement, ticker, limit, key, '').iloc[8:-2].astype(float).iloc[:, ::-1]
+    BS_df = fetch(fs.get_balance_sheet, ticker, limit, key, '').iloc[8:-2].astype(float).iloc[:, ::-1]
+    fgrowth_df = fetch(fs.get_financial_growth, ticker, limit, key).iloc[3:].astype(float).iloc[:, ::-1]
+    ratio_df = fetch(fs.get_financial_ratios, ticker, limit, key, 'annual').iloc[1:].astype(float).iloc[:, ::-1]
+    ratio_ttm_df = fetch(fs.get_financial_ratios, ticker, limit, key, 'ttm')
+    quote = fetch(fs.get_quote, ticker, key)
+
+    stage['name'] = 'reconstruct_BV'
+    ShE = BS_df.loc['totalStockholdersEquity']
+    WASHO = IS_df.loc['weightedAverageShsOut']
+    BV = fs.reconstruct_BV(ShE, WASHO, fgrowth_df.loc['threeYShareholdersEquityGrowthPerShare'], strict=True)
+
+    stage['name'] = 'get_allROE'
+    NI = IS_df.loc['netIncome']
+    roe_endE, roe_avgE = fs.get_allROE(BV, NI)
+
+    stage['name'] = 'S_RIM_ROE_Projection'
+    # S_RIM_ROE_Projection takes exactly five years
+    ROE = fs.equalize_date(ratio_df.loc['returnOnEquity'].iloc[-5:], NI[-5:], 0)
+    ROE_ttm = float(ratio_ttm_df.loc['returnOnEquityTTM'].iloc[0])
+    ROE_1, _ = fs.S_RIM_ROE_Projection(ROE, ROE_ttm)
+
+    stage['name'] = 'beta'
+    prices = context.get('prices')
+    if prices is None or ticker not in prices:
+        end = dt.datetime.now()
+        start = end - dt.timedelta(weeks=52 * context.get('years', 5) + 2)
+        prices = capm.get_data_yf([ticker], start, end, context.get('interval', '1mo'), market=True)
+    returns = capm.simp_ret(prices[['^GSPC', ticker]].dropna())
+    # get_beta_yf has a row per column, ^GSPC first
+    beta = capm.get_beta_yf(returns).set_index('ticker').loc[ticker, 'Beta']
+
+    stage['name'] = 'valuation'
+    B_0 = BV.iloc[-1]
+    Num_Shares = IS_df.loc['weightedAverageShsOutDil'].iloc[-1]
+    Re = context['rf'] + beta * context['market_premium']
+    FV_psh = RIM_valuation_single_stage(B_0, ROE_1, Re, Num_Shares, context.get('w', 1))
+    price = float(quote.loc['price'].iloc[0])
+    if not np.isfinite(FV_psh):
+        raise ValueError('non-finite value per share (1 + Re - w = {:.4f})'.format(1 + Re - context.get('w', 1)))
+    return {'B_0': B_0, 'ROE_endE': roe_endE.iloc[-1], 'ROE_avgE': roe_avgE.iloc[-1], 'ROE_1': ROE_1,
+            'Beta': beta, 'Re': Re, 'Num_Shares': Num_Shares, 'FV_psh': FV_psh,
+            'Price': price, 'Upside': FV_psh / price - 1}
+
+
+### Shards
+def shard_path(checkpoint_dir, n):
+    return os.path.join(checkpoint_dir, 'shard_{:05d}.json'.format(n))
+
+
+def write_json(path, obj):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(obj, f, default=float)
+    os.replace(tmp, path)
+
+
+def run_shard(n, tickers, value_fn, context, checkpoint_dir, quiet=True):
+    """Value every ticker of one shard, then checkpoint rows, errors, latencies and
+    the shard's instrument records (merged into the parent's by run())."""
+    echo, ins.echo = ins.echo, not quiet
+    rows, errors, latency = [], [], []
+    start = time.perf_counter()
+    with ins.capture() as records:
+        _value_shard(tickers, value_fn, context, quiet, rows, errors, latency)
+    ins.echo = echo
+
+    shard = {'shard': n, 'tickers': list(tickers), 'rows': rows, 'errors': errors,
+             'latency': latency, 'seconds': time.perf_counter() - start, 'instrument': records}
+    write_json(shard_path(checkpoint_dir, n), shard)
+    return shard
+
+
+def _value_shard(tickers, value_fn, context, quiet, rows, errors, latency):
+    for ticker in tickers:
+        stage = {'name': None}
+        t = time.perf_counter()
+        try:
+            # anything still printing directly is kept out of the worker logs
+            with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+                row = value_fn(ticker, context, stage)
+            rows.append(dict(row, ticker=ticker))
+        except Exception as e:
+            errors.append({'ticker': ticker, 'stage': stage['name'], 'error': type(e).__name__, 'message': str(e)})
+        latency.append(time.perf_counter() - t)
+
+
+def _shard_job(args):
+    return run_shard(*args)
+
+
+def check_manifest(checkpoint_dir, tickers, shard_size, resume):
+    # a checkpoint directory belongs to one universe and shard size
+    path = os.path.join(checkpoint_dir, MANIFEST)
+    manifest = {'tickers': list(tickers), 'shard_size': shard_size}
+    if resume and os.path.exists(path):
+        with open(path) as f:
+            if json.load(f) != manifest:
+                raise ValueError('{} holds a different universe or shard size; use resume=False'.format(checkpoint_dir))
+        return
+    for name in os.listdir(checkpoint_dir):
+        if name.startswith('shard_'):
+            os.remove(os.path.join(checkpoint_dir, name))
+    write_json(path, manifest)
+
+
+def run(tickers, context, value_fn=value_ticker, checkpoint_dir='nightly_checkpoints', shard_size=50,
+        processes=None, resume=True, quiet=True, verbose=True):
+    """Value the universe shard by shard, skipping shards already checkpointed.
+
+    value_fn(ticker, context, stage) -> dict of outputs; it must be picklable (module level).
+    Returns {'results': frame by ticker, 'errors': frame, 'stats': throughput and latency}.
+    """
+    tickers = list(tickers)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    check_manifest(checkpoint_dir, tickers, shard_size, resume)
+
+    shards = [tickers[i:i + shard_size] for i in range(0, len(tickers), shard_size)]
+    done = {n for n in range(len(shards)) if os.path.exists(shard_path(checkpoint_dir, n))}
+    jobs = [(n, shard, value_fn, context, checkpoint_dir, quiet) for n, shard in enumerate(shards) if n not in done]
+    if verbose:
+        print('{} shards: {} checkpointed, {} to run'.format(len(shards), len(done), len(jobs)))
+
+    start = time.perf_counter()
+    new = []
+    if processes == 1:
+        for job in jobs:
+            new.append(_shard_job(job))
+            ins.merge(new[-1]['instrument'])
+            if verbose:
+                print('shard {} done'.format(job[0]))
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [pool.submit(_shard_job, job) for job in jobs]
+            for future in as_completed(futures):
+                new.append(future.result())
+                # timings and errors recorded in the worker process
+                ins.merge(new[-1]['instrument'])
+                if verbose:
+                    print('shard {} done'.format(new[-1]['shard']))
+    seconds = time.perf_counter() - start
+
+    completed = new + [load_shard(checkpoint_dir, n) for n in sorted(done)]
+    completed.sort(key=lambda s: s['shard'])
+    stats = run_stats(completed, new, seconds)
+    stats.update({'shards': len(shards), 'shards_skipped': len(done)})
+    return {'results': collect(completed, 'rows', tickers),
+            'errors': collect(completed, 'errors'),
+            'stats': stats}
+
+
+def load_shard(checkpoint_dir, n):
+    with open(shard_path(checkpoint_dir, n)) as f:
+        return json.load(f)
+
+
+def collect(shards, part, order=None):
+    rows = [row for s in shards for row in s[part]]
+    if part == 'errors':
+        return pd.DataFrame(rows, columns=['ticker', 'stage', 'error', 'message'])
+    df = pd.DataFrame(rows).set_index('ticker') if rows else pd.DataFrame(index=pd.Index([], name='ticker'))
+    return df.reindex([t for t in order if t in df.index]) if order is not None else df
+
+
+def run_stats(completed, new, seconds):
+    """Throughput of this run and per ticker latency percentiles over every checkpointed shard."""
+    latency = np.array([x for s in completed for x in s['latency']])
+    ran = sum(len(s['tickers']) for s in new)
+    return {'tickers': len(latency),
+            'valued': sum(len(s['rows']) for s in completed),
+            'failed': sum(len(s['errors']) for s in completed),
+            'tickers_run': ran,
+            'seconds': seconds,
+            'tickers_per_sec': ran / seconds if seconds > 0 else np.nan,
+            'latency_p50': float(np.percentile(latency, 50)) if len(latency) else np.nan,
+            'latency_p99': float(np.percentile(latency, 99)) if len(latency) else np.nan}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('tickers', help='text file with one ticker per line')
+    parser.add_argument('--key', required=True, help='FMP API key')
+    parser.add_argument('--rf', type=float, default=0.04)
+    parser.add_argument('--market-premium', type=float, default=0.055)
+    parser.add_argument('--w', type=float, default=1)
+    parser.add_argument('--checkpoint-dir', default='nightly_checkpoints')
+    parser.add_argument('--shard-size', type=int, default=50)
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--fresh', action='store_true', help='discard existing checkpoints')
+    parser.add_argument('--out', default='nightly_valuation.csv')
+    args = parser.parse_args(argv)
+
+    with open(args.tickers) as f:
+        tickers = [line.strip() for line in f if line.strip()]
+    context = {'key': args.key, 'rf': args.rf, 'market_premium': args.market_premium, 'w': args.w}
+    out = run(tickers, context, checkpoint_dir=args.checkpoint_dir, shard_size=args.shard_size,
+              processes=args.processes, resume=not args.fresh)
+
+    out['results'].to_csv(args.out)
+    if len(out['errors']):
+        out['errors'].to_csv(os.path.splitext(args.out)[0] + '_errors.csv', index=False)
+    s = out['stats']
+    print('{valued}/{tickers} valued, {failed} failed, {tickers_per_sec:.2f} tickers/sec, '
+          'latency p50 {latency_p50:.3f}s p99 {latency_p99:.3f}s'.format(**s))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
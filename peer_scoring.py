@@ -0,0 +1,97 @@
+""" Composite peer scoring for relative value ranking on a dense (tickers x metrics) matrix.
+
+Same scores as the relative_value_comparison notebook (directional metric ranks,
+rank z-scores pooled per metric group, summed into agg_composite_score) computed
+with array operations instead of a melted long-format frame.
+"""
+import numpy as np
+import pandas as pd
+
+
+# Average ranks down each column (ties share their mean rank), NaN stays NaN
+def nan_rank(X):
+    X = np.asarray(X, dtype=float)
+    n = X.shape[0]
+    order = np.argsort(X, axis=0, kind='stable')  # NaN sorted last
+    S = np.take_along_axis(X, order, axis=0)
+    pos = np.arange(1, n + 1)[:, None]
+
+    # first and last sorted position of every run of equal values
+    starts = np.ones(S.shape, dtype=bool)
+    starts[1:] = S[1:] != S[:-1]
+    ends = np.ones(S.shape, dtype=bool)
+    ends[:-1] = S[:-1] != S[1:]
+    first = np.maximum.accumulate(np.where(starts, pos, 0), axis=0)
+    last = np.minimum.accumulate(np.where(ends, pos, n + 1)[::-1], axis=0)[::-1]
+
+    ranks = np.empty(X.shape)
+    np.put_along_axis(ranks, order, (first + last) / 2, axis=0)
+    ranks[np.isnan(X)] = np.nan
+    return ranks
+
+
+def composite_scores(X, direction, membership):
+    """Score tickers from a (tickers x metrics) matrix.
+
+    direction: +1 higher is better, -1 lower is better, 0 neutral (per metric).
+    membership: (metrics x groups) 0/1 matrix, each metric in at most one group.
+    Returns metric ranks, rank z-scores, (tickers x groups) composites,
+    agg_composite_score and agg_final_rank (1 = best).
+    """
+    X = np.asarray(X, dtype=float)
+    membership = np.asarray(membership, dtype=float)
+    used = membership.sum(axis=1) > 0
+
+    # higher the better value -> higher rank number -> higher z-score
+    ranks = nan_rank(X * np.asarray(direction, dtype=float))
+    ranks[:, ~used] = np.nan
+    valid = ~np.isnan(ranks)
+    filled = np.where(valid, ranks, 0)
+
+    # rank z-scores pooled over every ticker and metric of a group (ddof=0)
+    count = valid.sum(axis=0) @ membership
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (filled.sum(axis=0) @ membership) / count
+        dev = np.where(valid, ranks - membership @ mean, 0)
+        std = np.sqrt(((dev**2).sum(axis=0) @ membership) / count)
+        rank_z = np.where(valid, dev / (membership @ std), np.nan)
+
+    group_scores = np.nan_to_num(rank_z) @ membership
+    agg_composite_score = group_scores.sum(axis=1)
+    agg_final_rank = nan_rank(-agg_composite_score[:, None])[:, 0]
+
+    return {'metric_rank': ranks,
+            'metric_rank_z': rank_z,
+            'group_scores': group_scores,
+            'agg_composite_score': agg_composite_score,
+            'agg_final_rank': agg_final_rank}
+
+
+# Dense inputs from the notebook's peers_df, score lists and metric_groups
+def build_inputs(peers_df, increase_score_list, decrease_score_list, metric_groups):
+    metrics = [m for group in metric_groups.values() for m in group if m in peers_df.columns]
+    metrics = list(dict.fromkeys(metrics))
+    X = peers_df[metrics].to_numpy(dtype=float)
+
+    direction = np.where(pd.Index(metrics).isin(increase_score_list), 1,
+                         np.where(pd.Index(metrics).isin(decrease_score_list), -1, 0))
+
+    # a metric listed in several groups belongs to the last one, as in metric_to_group
+    metric_to_group = {m: g for g, group in metric_groups.items() for m in group}
+    groups = list(metric_groups)
+    membership = np.zeros((len(metrics), len(groups)))
+    membership[np.arange(len(metrics)), [groups.index(metric_to_group[m]) for m in metrics]] = 1
+
+    return X, direction, membership, metrics, groups
+
+
+def score_peers(peers_df, increase_score_list, decrease_score_list, metric_groups):
+    """Group composites, agg_composite_score and agg_final_rank per ticker, best first."""
+    X, direction, membership, metrics, groups = build_inputs(
+        peers_df, increase_score_list, decrease_score_list, metric_groups)
+    scores = composite_scores(X, direction, membership)
+
+    ranked = pd.DataFrame(scores['group_scores'], index=peers_df.index, columns=groups)
+    ranked['agg_composite_score'] = scores['agg_composite_score']
+    ranked['agg_final_rank'] = scores['agg_final_rank']
+    return ranked.sort_values(by='agg_composite_score', ascending=False)
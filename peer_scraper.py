@@ -0,0 +1,192 @@
+""" Peer-universe scraper and fundamentals table for relative value comparison.
+
+Fetches Finviz quote pages concurrently with a per-host rate limit, parses them with
+lxml and converts the snapshot table to numeric columns one column at a time.
+Pass fetch=fixture_fetcher(folder) to run offline against saved HTML pages.
+"""
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+import requests
+from lxml import html as lxml_html
+
+import instrument as ins
+from fmp_bulk import TokenBucket
+
+QUOTE_URL = 'https://finviz.com/quote.ashx?t={}&p=d'
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+
+# Columns that contain dual values in a single string cell
+DUAL_VALUE_COLS = {
+    '52W High': ('52W_high_price', '52W_high_distance'),
+    'EPS past 3/5Y': ('EPS_growth_3Y', 'EPS_growth_5Y'),
+    '52W Low': ('52W_low_price', '52W_low_distance'),
+    'Dividend Est.': ('dividend_est', 'dividend_yield_est'),
+    'Sales past 3/5Y': ('Sales_growth_3Y', 'Sales_growth_5Y'),
+    'Volatility': ('volatility_week', 'volatility_month'),
+    'Dividend TTM': ('dividend_ttm', 'dividend_yield_ttm'),
+    'Dividend Gr. 3/5Y': ('dividend_growth_3Y', 'dividend_growth_5Y'),
+    'EPS/Sales Surpr.': ('EPS_surprise', 'Sales_surprise'),
+}
+
+SUFFIX_MULTIPLIER = {'K': 1e3, 'M': 1e6, 'B': 1e9, 'T': 1e12, '%': 0.01}
+
+
+### Fetching
+class HostLimiter:
+    """One token bucket per host, `rate` requests per second each."""
+
+    def __init__(self, rate=1/1.5):
+        self.rate = rate
+        self.buckets = defaultdict(lambda: TokenBucket(rate, 1))
+
+    def wait(self, url):
+        self.buckets[urlparse(url).netloc].acquire()
+
+
+def http_fetcher(rate=1/1.5, session=None):
+    """fetch(ticker) -> html using a shared session, rate limited per host."""
+    session = session or requests.Session()
+    limiter = HostLimiter(rate)
+
+    def fetch(ticker):
+        url = QUOTE_URL.format(ticker)
+        limiter.wait(url)
+        res = session.get(url, headers=HEADERS)
+        res.raise_for_status()
+        return res.text
+    return fetch
+
+
+def fixture_fetcher(folder):
+    """fetch(ticker) -> html read from <folder>/<ticker>.html."""
+    def fetch(ticker):
+        with open(os.path.join(folder, '{}.html'.format(ticker)), encoding='utf-8') as f:
+            return f.read()
+    return fetch
+
+
+def fetch_pages(tickers, fetch=None, max_workers=8, save_folder=None):
+    """Fetch quote pages concurrently. Returns ({ticker: html}, {ticker: error message}).
+
+    Failures are also recorded in instrument.errors (stage 'fetch_pages').
+    """
+    fetch = fetch or http_fetcher()
+    pages, errors = {}, {}
+
+    def job(ticker):
+        try:
+            pages[ticker] = fetch(ticker)
+        except Exception as e:
+            errors[ticker] = '{}: {}'.format(type(e).__name__, e)
+            ins.record_error('fetch_pages', ticker, e, '[{}] Error fetching quote page:'.format(ticker))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        list(pool.map(job, tickers))
+
+    # keep the raw pages as offline fixtures
+    if save_folder is not None:
+        os.makedirs(save_folder, exist_ok=True)
+        for ticker, page in pages.items():
+            with open(os.path.join(save_folder, '{}.html'.format(ticker)), 'w', encoding='utf-8') as f:
+                f.write(page)
+    return pages, errors
+
+
+### Parsing
+def parse_quote_page(page, ticker):
+    """Snapshot table as {metric: string} and the peer tickers of one quote page."""
+    tree = lxml_html.fromstring(page)
+
+    # allow multiple values per key
+    data = defaultdict(list)
+    for row in tree.xpath('//table[contains(@class, "snapshot-table2")]//tr'):
+        cells = [td.text_content().strip() for td in row.xpath('./td')]
+        for i in range(0, len(cells) - 1, 2):
+            data[cells[i]].append(cells[i + 1])
+
+    # numbered keys if duplicates exist
+    deduped_data = {}
+    for key, values in data.items():
+        if len(values) == 1:
+            deduped_data[key] = values[0]
+        else:
+            for i, val in enumerate(values):
+                deduped_data['{}_{}'.format(key, i + 1)] = val
+
+    peers = []
+    for link in tree.xpath('//a[contains(@class, "tab-link")]'):
+        href = link.get('href', '')
+        if 'Peers' in link.text_content() and 'screener.ashx?t=' in href:
+            peers = [p for p in href.split('t=')[1].split('&')[0].split(',') if p != ticker]
+            break
+    return deduped_data, peers
+
+
+def get_peer_group_data(main_ticker, fetch=None, max_workers=8, save_folder=None):
+    """Raw string fundamentals of a ticker and its Finviz peers, indexed by Ticker.
+
+    Peers whose page fails are left out; their errors are in instrument.errors.
+    """
+    fetch = fetch or http_fetcher()
+    main_pages, errors = fetch_pages([main_ticker], fetch, 1, save_folder)
+    if main_ticker not in main_pages:
+        raise ValueError('[{}] quote page unavailable: {}'.format(main_ticker, errors.get(main_ticker)))
+    main_data, peers = parse_quote_page(main_pages[main_ticker], main_ticker)
+
+    pages, _ = fetch_pages(peers, fetch, max_workers, save_folder)
+    rows = {main_ticker: main_data}
+    for ticker in peers:
+        if ticker in pages:
+            rows[ticker] = parse_quote_page(pages[ticker], ticker)[0]
+
+    df = pd.DataFrame.from_dict(rows, orient='index')
+    df.index.name = 'Ticker'
+    return df
+
+
+### Cleaning
+# Vectorized string -> float conversion of one column
+# '1,234' -> 1234, '12.5B' -> 1.25e10, '3.4%' -> 0.034, '-' -> NaN, unparsable -> NaN
+def to_numeric(col):
+    s = col.astype('string').str.strip().str.replace(r'[,()]', '', regex=True)
+    suffix = s.str[-1:]
+    multiplier = suffix.map(SUFFIX_MULTIPLIER).astype(float)
+    number = s.where(multiplier.isna(), s.str[:-1])
+    return pd.to_numeric(number, errors='coerce') * multiplier.fillna(1).to_numpy()
+
+
+def clean_peers(df, drop=('Option/Short', 'Index')):
+    """Typed peers table: dual-value cells split in two, numeric metrics as float64."""
+    peers_df = df.drop(columns=[c for c in drop if c in df.columns])
+
+    # Process dual-value columns
+    for orig_col, (col1, col2) in DUAL_VALUE_COLS.items():
+        if orig_col not in peers_df.columns:
+            continue
+        parts = peers_df[orig_col].astype('string').str.split(expand=True)
+        two = parts.notna().sum(axis=1) == 2 if parts.shape[1] >= 2 else pd.Series(False, index=parts.index)
+        peers_df[col1] = parts[0].where(two, peers_df[orig_col])
+        peers_df[col2] = parts[1].where(two) if parts.shape[1] >= 2 else np.nan
+        peers_df = peers_df.drop(columns=orig_col)
+
+    # a column is numeric when every non-missing cell parses
+    out = {}
+    for col in peers_df.columns:
+        raw = peers_df[col].astype('string').str.strip()
+        missing = raw.isna() | raw.isin(['-', ''])
+        values = to_numeric(peers_df[col])
+        if values[~missing].notna().all():
+            out[col] = values.astype('float64')
+        else:
+            out[col] = raw.where(~missing)
+    return pd.DataFrame(out, index=peers_df.index)
+
+
+def write_peers(peers_df, path):
+    """Save the typed peers table (Parquet keeps the column dtypes)."""
+    peers_df.to_parquet(path)
@@ -0,0 +1,204 @@
+""" Local append-only price store for CAPM_fn, keyed by ticker and interval.
+
+Each (interval, ticker) is a directory of raw column files (dates as int64 ns,
+one float64 file per OHLC field) that are appended to on refresh and read back
+as memory-mapped arrays, so slices are views of the files rather than copies.
+
+meta.json holds the committed bar count, replaced atomically after every write. Reads
+stop at that count, and refresh() truncates bars left past it by an interrupted write,
+so every column always has the same bars.
+"""
+import json
+import os
+import numpy as np
+import pandas as pd
+
+import CAPM_fn as capm
+
+FIELDS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+
+### Raw column files
+def read_column(path, dtype):
+    """Memory-map a column file read-only (empty array if missing)."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r')
+
+
+def append_column(path, values, dtype):
+    with open(path, 'ab') as f:
+        f.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+
+
+def write_column(path, values, dtype):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+    os.replace(tmp, path)
+
+
+def overwrite_last(path, value, dtype):
+    """Overwrite the last row in place (file size and existing maps stay valid)."""
+    with open(path, 'r+b') as f:
+        f.seek(-np.dtype(dtype).itemsize, os.SEEK_END)
+        f.write(np.asarray(value, dtype=dtype).tobytes())
+
+
+def to_ns(index):
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.as_unit('ns').asi8
+
+
+class PriceStore:
+    """Incrementally refreshed on-disk OHLC history.
+
+    refresh() only downloads bars newer than the last stored date (plus `overlap`
+    bars to check against). If Close or Adj Close changed on those bars, e.g. after a
+    split or dividend adjustment, that ticker's history is downloaded again in full.
+    """
+
+    def __init__(self, path='price_store', download=None, overlap=5, rtol=1e-6):
+        self.path = path
+        self.download = download
+        self.overlap = overlap
+        self.rtol = rtol
+
+    def folder(self, ticker, interval):
+        return os.path.join(self.path, interval, ticker.replace('^', '_'))
+
+    def column_path(self, ticker, interval, field):
+        return os.path.join(self.folder(ticker, interval), field.replace(' ', '_') + ('.i8' if field == 'Date' else '.f8'))
+
+    def rows(self, ticker, interval):
+        path = os.path.join(self.folder(ticker, interval), 'meta.json')
+        if not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            return json.load(f)['rows']
+
+    def commit(self, ticker, interval, rows):
+        path = os.path.join(self.folder(ticker, interval), 'meta.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'rows': int(rows)}, f)
+        os.replace(path + '.tmp', path)
+
+    def truncate(self, ticker, interval):
+        """Cut every column file back to the committed bars (drops a torn write)."""
+        rows = self.rows(ticker, interval)
+        for field in ['Date'] + FIELDS:
+            path = self.column_path(ticker, interval, field)
+            if os.path.exists(path) and os.path.getsize(path) > rows * 8:
+                os.truncate(path, rows * 8)
+
+    def read(self, ticker, interval, field, rows=None):
+        dtype = np.int64 if field == 'Date' else np.float64
+        rows = self.rows(ticker, interval) if rows is None else rows
+        return read_column(self.column_path(ticker, interval, field), dtype)[:rows]
+
+    def arrays(self, ticker, interval, start=None, end=None, fields=FIELDS):
+        """Memory-mapped views of the stored bars between start and end (inclusive)."""
+        rows = self.rows(ticker, interval)
+        dates = self.read(ticker, interval, 'Date', rows)
+        lo = 0 if start is None else np.searchsorted(dates, to_ns([start])[0], side='left')
+        hi = len(dates) if end is None else np.searchsorted(dates, to_ns([end])[0], side='right')
+        out = {'Date': dates[lo:hi].view('datetime64[ns]')}
+        for field in fields:
+            out[field] = self.read(ticker, interval, field, rows)[lo:hi]
+        return out
+
+    def frame(self, ticker, interval, start=None, end=None, fields=FIELDS):
+        a = self.arrays(ticker, interval, start, end, fields)
+        return pd.DataFrame({f: a[f] for f in fields}, index=pd.DatetimeIndex(a['Date'], name='Date'))
+
+    def write(self, ticker, interval, bars, append):
+        os.makedirs(self.folder(ticker, interval), exist_ok=True)
+        rows = self.rows(ticker, interval) if append else 0
+        if not append:
+            # a reload interrupted halfway leaves no bars, downloaded again as 'new'
+            self.commit(ticker, interval, 0)
+        write = append_column if append else write_column
+        write(self.column_path(ticker, interval, 'Date'), to_ns(bars.index), np.int64)
+        for field in FIELDS:
+            write(self.column_path(ticker, interval, field), bars[field].to_numpy(dtype=float), np.float64)
+        self.commit(ticker, interval, rows + len(bars))
+
+    def fetch(self, tickers, start, end, interval):
+        return capm.get_prices_yf(tickers, start, end, interval, fields=FIELDS, download=self.download)
+
+    def refresh(self, tickers, start, end, interval):
+        """Bring every ticker up to `end`.
+
+        Returns {ticker: 'new' | 'appended' | 'reloaded' | 'unchanged' | 'missing'}.
+        """
+        status = {}
+        for t in tickers:
+            self.truncate(t, interval)
+        stored = {t: self.read(t, interval, 'Date') for t in tickers}
+        new = [t for t in tickers if len(stored[t]) == 0]
+        old = [t for t in tickers if len(stored[t]) > 0]
+
+        reload = []
+        if old:
+            # one batched download from the earliest overlap date of all stored tickers
+            since = min(stored[t][-min(self.overlap + 1, len(stored[t]))] for t in old)
+            recent = self.fetch(old, pd.Timestamp(since), end, interval)
+            for t in old:
+                bars = pd.DataFrame({f: recent[(f, t)] for f in FIELDS}).dropna(subset=['Adj Close'])
+                if self.restated(t, interval, bars):
+                    reload.append(t)
+                    continue
+                last = stored[t][-1]
+                dates = to_ns(bars.index)
+                if not (dates == last).any():
+                    status[t] = 'unchanged'
+                    continue
+                # the last stored bar may have been partial, so it is refreshed in place
+                for field in FIELDS:
+                    overwrite_last(self.column_path(t, interval, field), bars[field].to_numpy()[dates == last][0], np.float64)
+                self.write(t, interval, bars[dates > last], append=True)
+                status[t] = 'appended'
+
+        if new or reload:
+            full = self.fetch(new + reload, start, end, interval)
+            for t in new + reload:
+                bars = pd.DataFrame({f: full[(f, t)] for f in FIELDS}).dropna(subset=['Adj Close'])
+                if len(bars) == 0:
+                    # never replace a stored history with an empty download
+                    status[t] = 'missing'
+                    continue
+                self.write(t, interval, bars, append=False)
+                status[t] = 'new' if t in new else 'reloaded'
+        return status
+
+    def restated(self, ticker, interval, bars):
+        """True if the overlapping bars (excluding the last stored one) no longer match.
+
+        Only bars present and non-NaN on both sides are compared, so a bar missing from
+        the new download (or a stored NaN) is not mistaken for a restatement.
+        """
+        rows = self.rows(ticker, interval)
+        dates = self.read(ticker, interval, 'Date', rows)
+        check = dates[max(0, len(dates) - self.overlap - 1):-1]
+        if len(check) == 0:
+            return False
+        fresh = bars.reindex(pd.DatetimeIndex(check.view('datetime64[ns]')))
+        pos = np.searchsorted(dates, check)
+        for field in ['Close', 'Adj Close']:
+            new, old = fresh[field].to_numpy(dtype=float), np.asarray(self.read(ticker, interval, field, rows)[pos])
+            both = ~np.isnan(new) & ~np.isnan(old)
+            if not np.allclose(new[both], old[both], rtol=self.rtol):
+                return True
+        return False
+
+    # Same output as capm.get_data_yf, served from the store after an incremental refresh
+    def get_data(self, tickers, start, end, interval, OHLC='Adj Close', market=True):
+        if market == True:
+            tickers.insert(0,'^GSPC')
+        self.refresh(tickers, start, end, interval)
+
+        df = pd.concat({t: self.frame(t, interval, start, end, [OHLC])[OHLC] for t in tickers}, axis=1)
+        df.dropna(inplace=True)
+        return df
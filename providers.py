@@ -0,0 +1,173 @@
+""" Lazy registry of market data providers, chosen by name.
+
+A backend module is imported on the first providers.get(name), not when CAPM_fn
+or finance_scrapper are imported. Price providers share yf.download's interface:
+
+    download(tickers, start, end, interval, **kwargs) -> frame with (Price, Ticker) columns
+
+    'yfinance'           yfinance.download
+    'pandas_datareader'  pandas_datareader get_data_yahoo, one call per ticker
+    'file'               <folder>/<ticker>.csv fixtures (Date, Open, High, Low, Close, Adj Close, Volume)
+    'fake'               CAPM_fn.fake_download random walks
+    'fmp'                Financial Modeling Prep HTTP GETs on one pooled requests session
+                         (get(url)); finance_scrapper sends every request through it
+
+Rate providers return every observation of a series or table since `start`:
+
+    observations(name, start=None) -> frame of floats indexed by date
+
+    'fred'        fredapi series (FRED_API_KEY), one column named after the series
+    'quandl'      nasdaqdatalink tables such as USTREASURY/YIELD (QUANDL_API_KEY)
+    'rates_file'  <folder>/<name with '/' as '_'>.csv fixtures, first column the date
+
+register(name, factory) adds or replaces a backend, e.g.
+    providers.register('file', lambda: providers.FileProvider('fixtures'))
+"""
+import os
+import subprocess
+import sys
+import warnings
+
+import pandas as pd
+
+# columns of the price fixtures and of an empty download
+FIELDS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+_factories = {}
+_instances = {}
+
+
+def register(name, factory):
+    _factories[name] = factory
+    _instances.pop(name, None)
+
+
+def get(name):
+    if name not in _instances:
+        if name not in _factories:
+            raise KeyError('Unknown provider {!r}, registered: {}'.format(name, ', '.join(_factories)))
+        _instances[name] = _factories[name]()
+    return _instances[name]
+
+
+def loaded():
+    return list(_instances)
+
+
+def to_frame(per_ticker):
+    """{ticker: OHLC frame} -> one frame with (Price, Ticker) columns like yf.download."""
+    df = pd.concat(per_ticker, axis=1, names=['Ticker', 'Price'])
+    return df.swaplevel(axis=1).sort_index(axis=1, level=0, sort_remaining=False)
+
+
+class YFinanceProvider:
+    def __init__(self):
+        import yfinance
+        self.yf = yfinance
+
+    def download(self, tickers, start, end, interval, **kwargs):
+        # yfinance's deprecation chatter is silenced here only, not process-wide
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            return self.yf.download(tickers, start=start, end=end, interval=interval, **kwargs)
+
+
+class DatareaderProvider:
+    def __init__(self):
+        from pandas_datareader import data as web
+        self.web = web
+
+    def download(self, tickers, start, end, interval, **kwargs):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            return to_frame({t: self.web.get_data_yahoo(t, start, end, interval=interval) for t in tickers})
+
+
+class FileProvider:
+    def __init__(self, folder='price_fixtures'):
+        self.folder = folder
+
+    def download(self, tickers, start, end, interval, **kwargs):
+        frames = {}
+        for t in tickers:
+            path = os.path.join(self.folder, '{}.csv'.format(t))
+            if os.path.exists(path):
+                df = pd.read_csv(path, index_col='Date', parse_dates=True)
+                frames[t] = df.loc[pd.Timestamp(start):pd.Timestamp(end)]
+        if not frames:
+            # same (Price, Ticker) columns as a download with no data
+            columns = pd.MultiIndex.from_product([FIELDS, list(tickers)], names=['Price', 'Ticker'])
+            return pd.DataFrame(index=pd.DatetimeIndex([], name='Date'), columns=columns, dtype=float)
+        return to_frame(frames)
+
+
+class FakeProvider:
+    def download(self, tickers, start, end, interval, **kwargs):
+        import CAPM_fn
+        return CAPM_fn.fake_download(tickers, start, end, interval, **kwargs)
+
+
+class FMPProvider:
+    # session: any requests.Session, e.g. fmp_bulk's rate-limited one
+    def __init__(self, session=None):
+        if session is None:
+            import requests
+            session = requests.Session()
+        self.session = session
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs)
+
+
+class FredProvider:
+    def __init__(self, api_key=None):
+        from fredapi import Fred
+        self.fred = Fred(api_key=api_key or os.environ.get('FRED_API_KEY'))
+
+    def observations(self, name, start=None):
+        return self.fred.get_series(name, observation_start=start).astype(float).to_frame(name)
+
+
+class QuandlProvider:
+    def __init__(self, api_key=None):
+        import nasdaqdatalink
+        self.quandl = nasdaqdatalink
+        self.api_key = api_key or os.environ.get('QUANDL_API_KEY')
+
+    def observations(self, name, start=None):
+        return self.quandl.get(name, authtoken=self.api_key, start_date=start).astype(float)
+
+
+class FileRatesProvider:
+    def __init__(self, folder='rate_fixtures'):
+        self.folder = folder
+
+    def observations(self, name, start=None):
+        path = os.path.join(self.folder, '{}.csv'.format(name.replace('/', '_')))
+        df = pd.read_csv(path, index_col=0, parse_dates=True).astype(float)
+        return df if start is None else df.loc[pd.Timestamp(start):]
+
+
+register('yfinance', YFinanceProvider)
+register('pandas_datareader', DatareaderProvider)
+register('file', FileProvider)
+register('fake', FakeProvider)
+register('fmp', FMPProvider)
+register('fred', FredProvider)
+register('quandl', QuandlProvider)
+register('rates_file', FileRatesProvider)
+
+
+def import_time(module='CAPM_fn', runs=5):
+    """Best cold import time (seconds) of `module` in fresh interpreters and the
+    heavy backends it pulled in. Target for CAPM_fn: pandas' own import cost, with
+    neither yfinance nor pandas_datareader loaded."""
+    code = ('import sys, time; t = time.perf_counter(); import {}; t = time.perf_counter() - t; '
+            'print(t, *[m for m in ("yfinance", "pandas_datareader") if m in sys.modules])').format(module)
+    best, heavy = float('inf'), []
+    here = os.path.dirname(os.path.abspath(__file__))
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', code], cwd=here, capture_output=True, text=True, check=True)
+        seconds, *heavy = out.stdout.split()
+        best = min(best, float(seconds))
+    return {'module': module, 'seconds': best, 'backends_imported': heavy}
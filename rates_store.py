@@ -0,0 +1,185 @@
+""" Local store of the risk-free rate and credit spread series used for the cost of equity.
+
+Each series or table (e.g. FRED 'DGS10', Quandl 'USTREASURY/YIELD') is a directory of
+raw column files like price_store: dates as int64 ns and one float64 file per column,
+read back as memory-mapped arrays. sync() asks the provider only for observations
+from the last stored date on, so a run without new data does no more than one small
+request per series, and as-of lookups never touch the network.
+
+meta.json holds the column names and the committed row count, replaced atomically
+after every write. Reads stop at that count, and sync() truncates rows left past it by
+an interrupted append before writing, so a series is always whole rows of every column.
+
+Values are kept in the units of the source (FRED and Quandl rates are in percent).
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import providers
+from price_store import read_column, append_column, write_column, overwrite_last, to_ns
+
+# default source of each series the S-RIM notebook reads
+SERIES = {'DGS10': 'fred',               # 10Y Treasury constant maturity
+          'DFF': 'fred',                 # Federal Funds effective rate
+          'AAAFF': 'fred',               # Moody's Aaa corporate minus Fed Funds
+          'BAAFF': 'fred',               # Moody's Baa corporate minus Fed Funds
+          'BAMLC0A0CM': 'fred',          # ICE BofA US corporate OAS
+          'BAMLC0A4CBBB': 'fred',        # ICE BofA BBB OAS
+          'BAMLH0A0HYM2': 'fred',        # ICE BofA US high yield OAS
+          'USTREASURY/YIELD': 'quandl',  # Treasury par yield curve
+          'USTREASURY/HQMYC': 'quandl'}  # HQM corporate bond yield curve
+
+
+class RatesStore:
+    """Incrementally synced on-disk rate series with vectorized as-of lookups.
+
+    provider: registered rate provider used for every series, e.g. 'rates_file'
+    offline; by default each series uses its SERIES source.
+    """
+
+    def __init__(self, path='rates_store', provider=None):
+        self.path = path
+        self.provider = provider
+
+    def folder(self, name):
+        return os.path.join(self.path, name.replace('/', '_'))
+
+    def meta(self, name):
+        path = os.path.join(self.folder(name), 'meta.json')
+        if not os.path.exists(path):
+            return {'columns': [], 'rows': 0}
+        with open(path) as f:
+            return json.load(f)
+
+    def commit(self, name, columns, rows):
+        tmp = os.path.join(self.folder(name), 'meta.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump({'columns': [str(c) for c in columns], 'rows': int(rows)}, f)
+        os.replace(tmp, os.path.join(self.folder(name), 'meta.json'))
+
+    def columns(self, name):
+        return self.meta(name)['columns']
+
+    def column_path(self, name, j):
+        # columns are stored by position, names such as '10 YR' live in meta.json
+        return os.path.join(self.folder(name), 'Date.i8' if j is None else 'c{}.f8'.format(j))
+
+    def read(self, name, j, rows):
+        return read_column(self.column_path(name, j), np.int64 if j is None else np.float64)[:rows]
+
+    def dates(self, name):
+        return self.read(name, None, self.meta(name)['rows'])
+
+    def values(self, name, columns=None):
+        """(observations x columns) float64 array of the stored series."""
+        meta = self.meta(name)
+        stored = meta['columns']
+        columns = stored if columns is None else [columns] if isinstance(columns, str) else list(columns)
+        if not columns:
+            return np.empty((meta['rows'], 0))
+        return np.column_stack([self.read(name, stored.index(c), meta['rows']) for c in columns])
+
+    def frame(self, name, columns=None):
+        stored = self.columns(name)
+        columns = stored if columns is None else [columns] if isinstance(columns, str) else list(columns)
+        return pd.DataFrame(self.values(name, columns), columns=columns,
+                            index=pd.DatetimeIndex(self.dates(name).view('datetime64[ns]'), name='Date'))
+
+    ### Sync
+    def truncate(self, name):
+        """Cut every column file back to the committed rows (drops a torn append)."""
+        meta = self.meta(name)
+        for j in [None] + list(range(len(meta['columns']))):
+            path = self.column_path(name, j)
+            if os.path.exists(path) and os.path.getsize(path) > meta['rows'] * 8:
+                os.truncate(path, meta['rows'] * 8)
+
+    def write(self, name, df, append):
+        os.makedirs(self.folder(name), exist_ok=True)
+        rows = self.meta(name)['rows'] if append else 0
+        if not append:
+            # a rewrite interrupted halfway leaves an empty series, downloaded again by sync()
+            self.commit(name, [], 0)
+        write = append_column if append else write_column
+        write(self.column_path(name, None), to_ns(df.index), np.int64)
+        for j in range(df.shape[1]):
+            write(self.column_path(name, j), df.iloc[:, j].to_numpy(dtype=float), np.float64)
+        self.commit(name, df.columns, rows + len(df))
+
+    def sync(self, names=None):
+        """Bring every series up to date.
+
+        Returns {name: 'new' | 'appended' | 'unchanged' | 'reloaded' | 'missing'}.
+        A table whose columns changed (e.g. a new maturity) is downloaded again in full.
+        """
+        status = {}
+        for name in names or SERIES:
+            source = providers.get(self.provider or SERIES.get(name, 'fred'))
+            self.truncate(name)
+            dates = self.dates(name)
+            if len(dates) == 0:
+                df = source.observations(name).sort_index()
+                if len(df) == 0:
+                    status[name] = 'missing'
+                    continue
+                self.write(name, df, append=False)
+                status[name] = 'new'
+                continue
+
+            last = dates[-1]
+            df = source.observations(name, pd.Timestamp(last)).sort_index()
+            if [str(c) for c in df.columns] != self.columns(name):
+                self.write(name, source.observations(name).sort_index(), append=False)
+                status[name] = 'reloaded'
+                continue
+            new_dates = to_ns(df.index)
+            if (new_dates == last).any():
+                # the last stored observation may have been revised, refresh it in place
+                row = df.to_numpy(dtype=float)[new_dates == last][-1]
+                for j, value in enumerate(row):
+                    overwrite_last(self.column_path(name, j), value, np.float64)
+            if (new_dates > last).any():
+                self.write(name, df[new_dates > last], append=True)
+                status[name] = 'appended'
+            else:
+                status[name] = 'unchanged'
+        return status
+
+    ### Lookups
+    def asof(self, name, dates, columns=None):
+        """Last valid observation at or before each date, NaN before the first one.
+
+        dates: anything DatetimeIndex accepts. Returns (dates x columns) floats,
+        or a vector for a single column given by name. KeyError if the series is not synced.
+        """
+        stored = self.dates(name)
+        if len(stored) == 0:
+            raise KeyError('series {!r} is not synced'.format(name))
+        values = self.values(name, columns)
+        pos = np.searchsorted(stored, to_ns(dates), side='right') - 1
+
+        # row of the last non-NaN value up to each stored row, per column
+        rows = np.arange(len(stored))[:, None]
+        last_valid = np.maximum.accumulate(np.where(np.isnan(values), -1, rows), axis=0)
+        idx = last_valid[np.maximum(pos, 0)]
+        out = np.take_along_axis(values, np.maximum(idx, 0), axis=0)
+        out[(pos[:, None] < 0) | (idx < 0)] = np.nan
+        return out[:, 0] if isinstance(columns, str) else out
+
+    def latest(self, name, column=None):
+        meta = self.meta(name)
+        if meta['rows'] == 0:
+            raise KeyError('series {!r} is not synced'.format(name))
+        column = column or meta['columns'][0]
+        values = self.read(name, meta['columns'].index(column), meta['rows'])
+        valid = values[~np.isnan(values)]
+        return valid[-1] if len(valid) else np.nan
+
+
+# Risk-free rate (decimal) on each date as in the S-RIM notebook:
+# the larger of FRED DGS10 and the Treasury curve's 10 YR yield
+def risk_free(store, dates):
+    return np.fmax(store.asof('DGS10', dates, 'DGS10'), store.asof('USTREASURY/YIELD', dates, '10 YR')) / 100
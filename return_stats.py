@@ -0,0 +1,136 @@
+""" Streaming annualized return and risk statistics for long price histories.
+
+Reads a (dates x tickers) price matrix in row chunks (a DataFrame, an array or a
+memory-mapped file) and keeps per-ticker running accumulators, merged chunk by chunk
+with Chan's parallel update, so memory stays at one chunk regardless of history length.
+The annualized return comes from the mean log return instead of a product of gross
+returns, which underflows or overflows on long daily series.
+"""
+import numpy as np
+import pandas as pd
+
+
+# Chan et al. merge of (n, mean, M2) accumulators, elementwise over tickers
+def merge_moments(n_a, mean_a, M2_a, n_b, mean_b, M2_b):
+    n = n_a + n_b
+    with np.errstate(invalid='ignore', divide='ignore'):
+        delta = mean_b - mean_a
+        mean = np.where(n > 0, mean_a + delta * n_b / n, 0)
+        M2 = np.where(n > 0, M2_a + M2_b + delta**2 * n_a * n_b / n, 0)
+    return n, mean, M2
+
+
+def masked_moments(x, valid):
+    n = valid.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(n > 0, np.where(valid, x, 0).sum(axis=0) / n, 0)
+    dev = np.where(valid, x - mean, 0)
+    return n, mean, dev
+
+
+class ReturnStats:
+    """Online per-ticker statistics of simple returns, optionally against a market column.
+
+    update() takes consecutive chunks of prices; the last row of each chunk is kept
+    to form the first return of the next one.
+    """
+
+    def __init__(self, n_tickers, market=None, frequency=252):
+        self.market = market
+        self.frequency = frequency
+        self.last = None
+        zeros = lambda: np.zeros(n_tickers)
+        # own observations: count, mean, M2 of simple returns and sum of log returns
+        self.n, self.mean, self.M2, self.log_sum = zeros(), zeros(), zeros(), zeros()
+        # observations shared with the market: count, means, co-moment and market M2
+        self.n_p, self.mean_s, self.mean_m, self.C, self.M2_m = zeros(), zeros(), zeros(), zeros(), zeros()
+
+    def update(self, prices):
+        prices = np.asarray(prices, dtype=float)
+        if self.last is not None:
+            prices = np.vstack([self.last, prices])
+        if len(prices) == 0:
+            return self
+        self.last = prices[-1:].copy()
+        if len(prices) < 2:
+            return self
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            r = prices[1:] / prices[:-1] - 1
+            log_r = np.log1p(r)
+        valid = ~np.isnan(r)
+
+        n_b, mean_b, dev = masked_moments(r, valid)
+        self.log_sum += np.where(valid, log_r, 0).sum(axis=0)
+        self.n, self.mean, self.M2 = merge_moments(self.n, self.mean, self.M2,
+                                                   n_b, mean_b, (dev * dev).sum(axis=0))
+
+        if self.market is not None:
+            m = r[:, self.market]
+            pair = valid & valid[:, [self.market]]
+            n_b, mean_s, dev_s = masked_moments(r, pair)
+            _, mean_m, dev_m = masked_moments(np.broadcast_to(m[:, None], r.shape), pair)
+
+            n = self.n_p + n_b
+            with np.errstate(invalid='ignore', divide='ignore'):
+                w = np.where(n > 0, self.n_p * n_b / n, 0)
+            d_s, d_m = mean_s - self.mean_s, mean_m - self.mean_m
+            self.C = self.C + (dev_s * dev_m).sum(axis=0) + d_s * d_m * w
+            _, self.mean_s, _ = merge_moments(self.n_p, self.mean_s, 0, n_b, mean_s, 0)
+            self.n_p, self.mean_m, self.M2_m = merge_moments(self.n_p, self.mean_m, self.M2_m,
+                                                             n_b, mean_m, (dev_m * dev_m).sum(axis=0))
+        return self
+
+    def result(self, tickers=None, risk_free=0):
+        """Annualized statistics per ticker (risk_free is an annual rate).
+
+        Annual Return = exp(frequency * mean log return) - 1, as annual_simpret.
+        Sharpe uses the annualized arithmetic mean return in excess of risk_free.
+        """
+        f = self.frequency
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_log = np.where(self.n > 0, self.log_sum / self.n, np.nan)
+            volatility = np.sqrt(self.M2 / (self.n - 1) * f)
+            out = {'Annual Return': np.expm1(mean_log * f),
+                   'Annual Log Return': mean_log * f,
+                   'Volatility': volatility,
+                   'Sharpe': (self.mean * f - risk_free) / volatility,
+                   'N': self.n.astype(int)}
+            if self.market is not None:
+                out['Beta'] = self.C / self.M2_m
+        return pd.DataFrame(out, index=tickers)
+
+
+### Chunk sources
+def iter_chunks(prices, chunk_rows=2520):
+    # a DataFrame is converted one chunk at a time, never as a whole
+    frame = isinstance(prices, pd.DataFrame)
+    for start in range(0, len(prices), chunk_rows):
+        yield prices.iloc[start:start+chunk_rows].to_numpy(dtype=float) if frame else prices[start:start+chunk_rows]
+
+
+# Raw row-major float64 (dates x tickers) price file, read lazily
+def memmap_prices(path, n_tickers, dtype=np.float64):
+    return np.memmap(path, dtype=dtype, mode='r').reshape(-1, n_tickers)
+
+
+def stream_stats(prices, tickers=None, market='^GSPC', frequency=252, risk_free=0, chunk_rows=2520):
+    """Annual Return, Annual Log Return, Volatility, Sharpe, N (and Beta) per ticker in one pass.
+
+    prices: DataFrame, array or memmap of prices (dates x tickers).
+    market: column name or position of the market index, None to skip Beta.
+    A name needs `tickers` (or DataFrame columns) holding it, else ValueError.
+    """
+    if tickers is None and isinstance(prices, pd.DataFrame):
+        tickers = prices.columns
+    if market is not None and not isinstance(market, (int, np.integer)):
+        if tickers is None or market not in list(tickers):
+            raise ValueError('market {!r} is not one of the tickers; pass its position, or market=None '
+                             'to skip Beta'.format(market))
+        market = list(tickers).index(market)
+
+    stats = ReturnStats(prices.shape[1], market, frequency)
+    for chunk in iter_chunks(prices, chunk_rows):
+        # memmap chunks are views and DataFrame chunks one chunk's copy; update() adds a chunk of returns
+        stats.update(chunk)
+    return stats.result(tickers, risk_free)
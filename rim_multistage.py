@@ -0,0 +1,124 @@
+""" Multi-stage residual income valuation discounted on a rate term structure.
+
+Stages, all as (tickers x horizon) arrays:
+    explicit  years 1..N use the given ROE forecasts
+    fade      years N+1..N+F move the ROE - Re spread linearly to fade_to * spread
+    terminal  RI_{T+1} / (1 + Re_T - w) at T = N+F, as in RIM_valuation_single_stage
+
+Book value rolls forward with clean surplus, B_t = B_{t-1} * (1 + ROE_t * (1 - payout)),
+and RI_t = B_{t-1} * (ROE_t - Re_t). Re_t is the one-year forward rate of the curve plus
+each ticker's equity premium (beta * market premium); the forward curve must cover
+N + F + 1 years and is never extended.
+
+Discount factors are precomputed once per premium bucket and shared by every ticker in
+it: premia are rounded to `premium_step` (default 1bp, i.e. a 0.002 beta step at a 5.5%
+market premium) so nearby tickers reuse one table. premium_step=None keeps exact premia,
+one table per distinct value.
+"""
+import time
+import numpy as np
+
+from capm_screener import maturity_years
+
+
+### Rate curve
+def spot_curve(yields, horizon):
+    """Annual spot rates for years 1..horizon from a yield curve (decimal rates).
+
+    yields: Series indexed by maturity in years or Quandl USTREASURY/YIELD labels
+    ('1 MO' .. '30 YR'), e.g. YC_rates.iloc[-1] / 100. Treasury par yields are used
+    as spot rates; the curve is flat beyond its first and last maturity.
+    """
+    yields = yields.dropna()
+    maturities = np.array([maturity_years(m) for m in yields.index])
+    order = np.argsort(maturities)
+    return np.interp(np.arange(1, horizon + 1), maturities[order], yields.to_numpy(dtype=float)[order])
+
+
+def forward_rates(spot):
+    """One-year forward rates f_t with (1 + s_t)^t = prod_{k<=t} (1 + f_k)."""
+    t = np.arange(1, len(spot) + 1)
+    growth = (1 + spot) ** t
+    return growth / np.concatenate([[1.0], growth[:-1]]) - 1
+
+
+def discount_table(forward, premium, step=None):
+    """Per-ticker Re_t and discount factors, computed once per premium bucket.
+
+    Returns (Re, DF), both (tickers x horizon): Re_t = f_t + premium and
+    DF_t = prod_{k<=t} 1 / (1 + Re_k). step rounds premia to a grid first.
+    """
+    premium = np.atleast_1d(np.asarray(premium, dtype=float))
+    if step:
+        premium = np.round(premium / step) * step
+    unique, inverse = np.unique(premium, return_inverse=True)
+    Re = np.asarray(forward, dtype=float)[None, :] + unique[:, None]
+    DF = np.exp(-np.cumsum(np.log1p(Re), axis=1))
+    return Re[inverse], DF[inverse]
+
+
+### Valuation
+def rim_multistage(B_0, ROE, Num_Shares, forward, premium, fade_years=10, fade_to=0, payout=0, w=1,
+                   premium_step=1e-4):
+    """Multi-stage RIM value per ticker.
+
+    B_0, Num_Shares: per ticker. ROE: (tickers x N) explicit forecasts (a vector is N=1).
+    forward: one-year forward rates for at least N + fade_years + 1 years.
+    premium: equity premium over the curve per ticker. payout: dividend payout ratio.
+    w: terminal persistence factor, w=1 is a perpetuity of the last residual income.
+    premium_step: grid premia are rounded to for shared discount tables (None: exact).
+    """
+    B_0 = np.asarray(B_0, dtype=float)
+    ROE = np.asarray(ROE, dtype=float)
+    if ROE.ndim == 1:
+        ROE = ROE[:, None]
+    n_tickers, N = ROE.shape
+    T = N + fade_years
+    payout = np.broadcast_to(np.asarray(payout, dtype=float), (n_tickers,))[:, None]
+
+    forward = np.asarray(forward, dtype=float)
+    if len(forward) < T + 1:
+        raise ValueError('forward covers {} years, the valuation needs N + fade_years + 1 = {}'.format(len(forward), T + 1))
+    Re, DF = discount_table(forward[:T + 1], np.broadcast_to(premium, (n_tickers,)), premium_step)
+
+    # ROE path: explicit forecasts, then the spread to Re fades linearly to fade_to * spread
+    spread_N = ROE[:, -1] - Re[:, N - 1]
+    k = np.arange(1, fade_years + 1) / max(fade_years, 1)
+    fade = spread_N[:, None] * (1 - k * (1 - fade_to))
+    path = np.concatenate([ROE, Re[:, N:T] + fade], axis=1)              # (tickers x T)
+
+    # clean surplus book values B_0 .. B_{T-1}
+    growth = np.cumprod(1 + path * (1 - payout), axis=1)
+    B = B_0[:, None] * np.concatenate([np.ones((n_tickers, 1)), growth[:, :-1]], axis=1)
+    B_T = B_0 * growth[:, -1]
+
+    RI = B * (path - Re[:, :T])
+    PV = RI * DF[:, :T]
+    spread_T = path[:, -1] - Re[:, T - 1]
+    RI_T1 = B_T * spread_T
+    TV = RI_T1 / (1 + Re[:, T] - w)
+    PV_terminal = TV * DF[:, T - 1]
+
+    V_0 = B_0 + PV.sum(axis=1) + PV_terminal
+    return {'V_0': V_0,
+            'FV_psh': V_0 / np.asarray(Num_Shares, dtype=float),
+            'PV_explicit': PV[:, :N].sum(axis=1),
+            'PV_fade': PV[:, N:].sum(axis=1),
+            'PV_terminal': PV_terminal,
+            'ROE_path': path,
+            'BV_path': B}
+
+
+# Timing of a universe revaluation on synthetic inputs
+def benchmark_rim(n_tickers=5000, explicit_years=5, fade_years=10, seed=0):
+    rng = np.random.default_rng(seed)
+    forward = forward_rates(np.linspace(0.04, 0.045, explicit_years + fade_years + 1))
+    B_0 = 1e9 * rng.uniform(0.5, 50, n_tickers)
+    ROE = rng.normal(0.12, 0.05, (n_tickers, explicit_years))
+    shares = 1e6 * rng.uniform(50, 5000, n_tickers)
+    premium = rng.uniform(0.5, 1.8, n_tickers) * 0.055
+
+    start = time.perf_counter()
+    out = rim_multistage(B_0, ROE, shares, forward, premium, fade_years, payout=0.3, w=0.9)
+    return {'tickers': n_tickers, 'horizon': explicit_years + fade_years, 'seconds': time.perf_counter() - start,
+            'finite': bool(np.isfinite(out['FV_psh']).all())}
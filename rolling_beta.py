@@ -0,0 +1,154 @@
+""" Rolling and EWMA betas for a whole universe from running sums.
+
+Works on (dates x tickers) arrays of periodic returns against one market return series.
+Window sums of x, y, xy and x^2 (x = market, y = stock) are kept per ticker, so every
+step costs O(1) per ticker whatever the window length.
+"""
+import numpy as np
+
+
+# Moving window sums along axis 0 by differencing cumulative sums
+def window_sums(a, window):
+    c = np.cumsum(a, axis=0)
+    c[window:] -= c[:-window]
+    return c
+
+
+# Rolling betas for every ticker at once
+# A window needs `window` dates where both the stock and the market are observed
+# Tickers are processed in column blocks to bound the temporary arrays
+def rolling_betas(market, stocks, window, block=256):
+    x = np.asarray(market, dtype=float)
+    y = np.asarray(stocks, dtype=float)
+    if y.ndim == 1:
+        y = y[:, None]
+
+    beta = np.empty(y.shape)
+    for j in range(0, y.shape[1], block):
+        beta[:, j:j+block] = _rolling_betas_block(x, y[:, j:j+block], window)
+    return beta
+
+
+def _rolling_betas_block(x, y, window):
+    # centre each series so the differenced sums do not lose precision
+    x = x - np.nanmean(x)
+    y = y - np.nanmean(y, axis=0)
+
+    valid = ~np.isnan(y) & ~np.isnan(x)[:, None]
+    x0 = np.where(valid, x[:, None], 0)
+    y0 = np.where(valid, y, 0)
+
+    n = window_sums(valid.astype(float), window)
+    sx = window_sums(x0, window)
+    sy = window_sums(y0, window)
+    sxy = window_sums(x0 * y0, window)
+    sxx = window_sums(x0 * x0, window)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        beta = (sxy - sx * sy / n) / (sxx - sx * sx / n)
+    beta[n < window] = np.nan
+    return beta
+
+
+# Moving average of betas, NaN until ma_window valid betas are available
+def moving_average(beta, ma_window):
+    valid = ~np.isnan(beta)
+    count = window_sums(valid.astype(float), ma_window)
+    total = window_sums(np.where(valid, beta, 0), ma_window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ma = total / count
+    ma[count < ma_window] = np.nan
+    return ma
+
+
+# Exponentially weighted betas, halflife in periods
+def ewma_betas(market, stocks, halflife):
+    engine = RollingBeta(np.shape(stocks)[1], window=None, halflife=halflife)
+    out = np.empty(np.shape(stocks))
+    for t in range(len(out)):
+        out[t] = engine.update(market[t], stocks[t])['beta_ewm']
+    return out
+
+
+class RollingBeta:
+    """Incremental rolling beta engine for live daily appends.
+
+    update(market_ret, stock_rets) adds one date for all tickers and returns the
+    current rolling beta, its moving average (ma_window) and the EWMA beta (halflife).
+    window=None keeps only the EWMA beta.
+    """
+
+    def __init__(self, n_tickers, window, ma_window=None, halflife=None):
+        self.window = window
+        self.ma_window = ma_window
+        self.t = 0
+
+        # ring buffers of the last `window` observations
+        if window:
+            self.x = np.zeros(window)
+            self.y = np.zeros((window, n_tickers))
+            self.valid = np.zeros((window, n_tickers), dtype=bool)
+            self.sums = np.zeros((5, n_tickers))  # n, sx, sy, sxy, sxx
+
+        if window and ma_window:
+            self.betas = np.full((ma_window, n_tickers), np.nan)
+
+        self.decay = None
+        if halflife:
+            self.decay = 0.5 ** (1 / halflife)
+            self.ewm = np.zeros((5, n_tickers))
+
+    @classmethod
+    def from_history(cls, market, stocks, window, ma_window=None, halflife=None):
+        """Build the engine by replaying a (dates x tickers) history."""
+        stocks = np.asarray(stocks, dtype=float)
+        engine = cls(stocks.shape[1], window, ma_window, halflife)
+        for t in range(len(stocks)):
+            engine.update(market[t], stocks[t])
+        return engine
+
+    @staticmethod
+    def terms(x, y, valid):
+        x0 = np.where(valid, x, 0)
+        y0 = np.where(valid, y, 0)
+        return np.array([valid.astype(float), x0, y0, x0 * y0, x0 * x0])
+
+    @staticmethod
+    def beta_from(sums):
+        n, sx, sy, sxy, sxx = sums
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (sxy - sx * sy / n) / (sxx - sx * sx / n)
+
+    def update(self, market_ret, stock_rets):
+        y = np.asarray(stock_rets, dtype=float)
+        valid = ~np.isnan(y) & ~np.isnan(market_ret)
+        new = self.terms(market_ret, y, valid)
+        self.t += 1
+        out = {}
+
+        if self.window:
+            # drop the observation leaving the window, add the new one
+            slot = (self.t - 1) % self.window
+            if self.t > self.window:
+                self.sums -= self.terms(self.x[slot], self.y[slot], self.valid[slot])
+            self.x[slot], self.y[slot], self.valid[slot] = market_ret, y, valid
+            self.sums += new
+
+            # rebuild the sums from the buffer once per window to stop float drift
+            if self.t % self.window == 0:
+                self.sums = self.terms(self.x[:, None], self.y, self.valid).sum(axis=1)
+
+            beta = self.beta_from(self.sums)
+            beta[self.sums[0] < self.window] = np.nan
+            out['beta'] = beta
+
+            if self.ma_window:
+                self.betas[self.t % self.ma_window] = beta
+                out['beta_ma'] = self.betas.mean(axis=0) if self.t >= self.ma_window else np.full_like(beta, np.nan)
+
+        if self.decay is not None:
+            # weights decay only where the ticker is observed
+            self.ewm = np.where(valid, self.decay * self.ewm + new, self.ewm)
+            out['beta_ewm'] = self.beta_from(self.ewm)
+
+        return out
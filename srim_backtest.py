@@ -0,0 +1,123 @@
+""" Walk-forward S-RIM backtest over a cross-section of tickers.
+
+Replaces the S-RIM notebook's backtest loop: every `window`-year ROE forecast window
+is a strided view, all windows of all tickers are forecast in one batched pass,
+and prices are resampled and aligned to the fiscal dates once for the whole panel.
+Inputs are (tickers x years) arrays, oldest fiscal year first.
+"""
+import time
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+import instrument as ins
+from srim_panel import panel_ROE_projection
+
+
+# Reverse valuation (S-RIM notebook): inputs implied by a given value V_0
+def rev_val_derive_Re(V_0, B_0, ROE_1, Num_Shares, w=1, w_0=1):
+    return ((V_0 - B_0) - w*(V_0 - B_0) - (B_0 * w_0 * ROE_1)) / (-B_0 * w_0 - (V_0 - B_0))
+
+
+def rev_val_derive_ROE(V_0, B_0, Re, Num_Shares, w=1, w_0=1):
+    return ((V_0 - B_0) - w*(V_0 - B_0) + Re*(V_0 - B_0) + (B_0 * w_0 * Re)) / (B_0 * w_0)
+
+
+# ROE_1 forecast for every window, posted on the window's last row (t+1 estimate at t)
+# ROE_ttm replaces the last observation of the latest window only
+def rolling_ROE_forecasts(ROE, window=5, ROE_ttm=None):
+    ROE = np.atleast_2d(np.asarray(ROE, dtype=float))
+    n_tickers, n_years = ROE.shape
+    estimates = np.full(ROE.shape, np.nan)
+    if n_years < window:
+        return estimates
+
+    windows = sliding_window_view(ROE, window, axis=1)  # (tickers, years-window+1, window) view
+    ROE_1 = panel_ROE_projection(windows.reshape(-1, window))[0]
+    ROE_1 = ROE_1.reshape(n_tickers, -1)
+
+    if ROE_ttm is not None:
+        ROE_1[:, -1] = panel_ROE_projection(windows[:, -1], ROE_ttm)[0]
+
+    estimates[:, window-1:] = ROE_1
+    return estimates
+
+
+# Mean price over the 12 months up to each fiscal date, for all tickers at once
+# (the notebook's calendar-year means lined up from the end drift by a year mid-year)
+# prices: (dates x tickers) DataFrame in ticker order, fiscal_dates: (tickers x years) datetime64
+def fiscal_year_prices(prices, fiscal_dates):
+    monthly = prices.resample('ME').mean().rolling(12, min_periods=1).mean()
+    months = monthly.index.values
+    values = monthly.to_numpy(dtype=float)
+
+    fiscal_dates = np.asarray(fiscal_dates, dtype='datetime64[ns]')
+    idx = np.searchsorted(months, fiscal_dates, side='right') - 1
+    ticker = np.broadcast_to(np.arange(fiscal_dates.shape[0])[:, None], fiscal_dates.shape)
+    out = values[np.clip(idx, 0, None), ticker]
+    out[idx < 0] = np.nan
+    return out
+
+
+def shift1(a):
+    out = np.full(a.shape, np.nan)
+    out[:, 1:] = a[:, :-1]
+    return out
+
+
+def walk_forward(ROE, BV, Num_Shares, Re, w=1, window=5, ROE_ttm=None,
+                 prices=None, fiscal_dates=None, verbose=True):
+    """Walk-forward S-RIM backtest for every ticker.
+
+    Re: scalar, per ticker vector or (tickers x years) matrix of cost of equity.
+    Returns a dict of (tickers x years) arrays and per-stage timings in seconds.
+    """
+    timings = {}
+    start = total = time.perf_counter()
+
+    BV = np.atleast_2d(np.asarray(BV, dtype=float))
+    Num_Shares = np.atleast_2d(np.asarray(Num_Shares, dtype=float))
+    ROE = np.atleast_2d(np.asarray(ROE, dtype=float))
+    Re = np.asarray(Re, dtype=float)
+    if Re.ndim == 1:
+        Re = Re[:, None]
+
+    out = {'ROE_estimate(t+1)': rolling_ROE_forecasts(ROE, window, ROE_ttm)}
+    timings['forecast'] = time.perf_counter() - start
+
+    # same valuation as the notebook backtest cells, constant w
+    start = time.perf_counter()
+    persistence = w / (1 + Re - w)
+    out['ROE_surprise(t)'] = ROE - shift1(out['ROE_estimate(t+1)'])
+    out['RI_actual(t)'] = BV * (ROE - Re)
+    out['RI_estimates(t+1)'] = BV * (out['ROE_estimate(t+1)'] - Re)
+    out['RI_surprise(t)'] = out['RI_actual(t)'] - shift1(out['RI_estimates(t+1)'])
+    out['V_0(Expected ROE)'] = BV + out['RI_estimates(t+1)'] * persistence
+    out['V_0(Actual ROE)'] = BV + out['RI_actual(t)'] * persistence
+    out['V_psh(Expected ROE)'] = out['V_0(Expected ROE)'] / Num_Shares
+    out['V_psh(Actual ROE)'] = out['V_0(Actual ROE)'] / Num_Shares
+    out['V_psh_surprise(t)'] = out['V_psh(Actual ROE)'] - shift1(out['V_psh(Expected ROE)'])
+    timings['valuation'] = time.perf_counter() - start
+
+    if prices is not None:
+        start = time.perf_counter()
+        out['Mkt_Price'] = fiscal_year_prices(prices, fiscal_dates)
+        V_0 = out['Mkt_Price'] * Num_Shares
+        out['V_0(Mkt_Price)'] = V_0
+        out['Derived_ROE(t+1)'] = rev_val_derive_ROE(V_0, BV, Re, Num_Shares, w)
+        out['Derived_Re(t)'] = rev_val_derive_Re(V_0, BV, out['ROE_estimate(t+1)'], Num_Shares, w)
+        timings['prices'] = time.perf_counter() - start
+
+    timings['total'] = time.perf_counter() - total
+    for stage, seconds in timings.items():
+        ins.add_timing('srim_backtest.walk_forward.' + stage, seconds)
+    if verbose:
+        print('walk-forward {} tickers x {} years: '.format(*ROE.shape)
+              + ', '.join('{} {:.4f}s'.format(k, v) for k, v in timings.items()))
+    out['timings'] = timings
+    return out
+
+
+# One ticker's results as a frame like the notebook's valuation_df
+def ticker_frame(result, i, index):
+    return pd.DataFrame({k: v[i] for k, v in result.items() if k != 'timings'}, index=index)
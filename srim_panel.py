@@ -0,0 +1,173 @@
+""" Vectorized panel S-RIM valuation over many tickers at once.
+
+All inputs are aligned NumPy arrays shaped (tickers x years), oldest year first,
+the same orientation as the per-ticker Series in finance_scrapper.
+"""
+import contextlib
+import io
+import time
+import numpy as np
+import pandas as pd
+
+import finance_scrapper as fs
+import instrument as ins
+
+# Regime codes returned by panel_ROE_projection
+SIDEWAYS, RISING, FALLING = 0, 1, 2
+
+
+# Per-ticker single stage valuation (same as the S-RIM notebook)
+def RIM_valuation_single_stage(B_0, ROE_1, Re, Num_Shares,  w=1):
+    RI = B_0 * (ROE_1 - Re)
+    V_0 = B_0 + RI * (1/(1+Re-w)) # w/(1+Re-w))
+    FV_psh = V_0 / Num_Shares
+
+    return FV_psh
+
+
+# ROE on end of period and average equity, panel version of fs.get_allROE
+def panel_ROE(BV, NI):
+    BV = np.asarray(BV, dtype=float)
+    NI = np.asarray(NI, dtype=float)
+
+    roe_endE = NI / BV
+    AvgE = np.full_like(BV, np.nan)
+    AvgE[:, 1:] = (BV[:, 1:] + BV[:, :-1]) / 2
+    roe_avgE = NI / AvgE
+
+    return roe_endE, roe_avgE
+
+
+# Last S-RIM weighted ROE estimate per row, i.e. fs.S_RIM_ROE_estimates(roe)[-1]
+def panel_S_RIM_ROE_estimate(roe):
+    return fs.S_RIM_ROE_estimates_array(roe)[:, -1]
+
+
+# S-RIM ROE_1 estimation, panel version of fs.S_RIM_ROE_Projection
+# Strictly rising or falling ROE keeps the last observation, otherwise the S-RIM estimate
+def panel_ROE_projection(ROE_data, ROE_ttm=None):
+    ROE_data = np.array(ROE_data, dtype=float)
+
+    # Plug in ttm value of ROE if specified
+    if ROE_ttm is not None:
+        ROE_data[:, -1] = ROE_ttm
+
+    rising = np.all(ROE_data[:, 1:] > ROE_data[:, :-1], axis=1)
+    falling = np.all(ROE_data[:, 1:] < ROE_data[:, :-1], axis=1)
+
+    ROE_1 = np.where(rising | falling, ROE_data[:, -1], panel_S_RIM_ROE_estimate(ROE_data))
+    regime = np.select([rising, falling], [RISING, FALLING], SIDEWAYS)
+
+    return ROE_1, regime
+
+
+# Single stage valuation per share for every ticker
+# w=1 is the infinite persistence case, w<1 fades residual income every year
+def panel_RIM_valuation(B_0, ROE_1, Re, Num_Shares, w=1):
+    RI = B_0 * (ROE_1 - Re)
+    V_0 = B_0 + RI / (1 + Re - w)
+
+    return V_0 / Num_Shares
+
+
+@ins.timed()
+def panel_S_RIM(BV, NI, Num_Shares, Re, w=1, ROE_ttm=None, window=5, equity='end'):
+    """Panel S-RIM valuation in one vectorized pass.
+
+    BV, NI, Num_Shares: (tickers x years) arrays, Re: cost of equity per ticker.
+    The last `window` years of ROE on end (or 'avg') equity feed the ROE_1 forecast.
+    """
+    roe_endE, roe_avgE = panel_ROE(BV, NI)
+    roe = roe_endE if equity == 'end' else roe_avgE
+
+    ROE_1, regime = panel_ROE_projection(roe[:, -window:], ROE_ttm)
+
+    B_0 = np.asarray(BV, dtype=float)[:, -1]
+    shares = np.asarray(Num_Shares, dtype=float)[:, -1]
+    Re = np.asarray(Re, dtype=float)
+
+    return {'roe_endE': roe_endE,
+            'roe_avgE': roe_avgE,
+            'ROE_1': ROE_1,
+            'regime': regime,
+            'FV_psh': panel_RIM_valuation(B_0, ROE_1, Re, shares, 1),
+            'FV_psh_w': panel_RIM_valuation(B_0, ROE_1, Re, shares, w)}
+
+
+# Synthetic (tickers x years) fundamentals for offline runs
+def synthetic_panel(n_tickers, n_years=10, seed=0):
+    rng = np.random.default_rng(seed)
+    roe = rng.normal(0.12, 0.05, (n_tickers, n_years))
+    BV = 1e9 * rng.uniform(0.5, 50, (n_tickers, 1)) * np.cumprod(1 + roe * 0.6, axis=1)
+    NI = BV * roe
+    shares = 1e6 * rng.uniform(50, 5000, (n_tickers, 1)) * np.ones(n_years)
+    Re = rng.uniform(0.06, 0.12, n_tickers)
+    return BV, NI, shares, Re
+
+
+# Time the per-ticker pandas path against the panel engine and check they agree
+def benchmark_panel(n_tickers=1000, n_years=10, w=0.9, seed=0):
+    BV, NI, shares, Re = synthetic_panel(n_tickers, n_years, seed)
+    dates = pd.date_range('2000-12-31', periods=n_years, freq='YE').strftime('%Y-%m-%d')
+
+    start = time.perf_counter()
+    loop_vals = np.empty((n_tickers, 2))
+    # S_RIM_ROE_Projection prints its regime for every call
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(n_tickers):
+            roe_endE, roe_avgE = fs.get_allROE(pd.Series(BV[i], index=dates), pd.Series(NI[i], index=dates))
+            ROE_1, _ = fs.S_RIM_ROE_Projection(roe_endE[-5:])
+            loop_vals[i, 0] = RIM_valuation_single_stage(BV[i, -1], ROE_1, Re[i], shares[i, -1], 1)
+            loop_vals[i, 1] = RIM_valuation_single_stage(BV[i, -1], ROE_1, Re[i], shares[i, -1], w)
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    out = panel_S_RIM(BV, NI, shares, Re, w)
+    panel_time = time.perf_counter() - start
+
+    panel_vals = np.column_stack([out['FV_psh'], out['FV_psh_w']])
+    return {'tickers': n_tickers,
+            'loop_sec': loop_time,
+            'panel_sec': panel_time,
+            'speedup': loop_time / panel_time,
+            'max_abs_diff': np.nanmax(np.abs(loop_vals - panel_vals))}
+
+
+# Original per-prefix loop of fs.S_RIM_ROE_estimates, O(n^2), kept as the benchmark reference
+def S_RIM_ROE_estimates_loop(roe_data):
+    S_RIM_ROE_estimates = roe_data.copy()
+    weights = list(range(1,1+roe_data.count()))
+
+    for w in weights:
+        x = weights[:w]
+        if pd.isna(roe_data.iloc[0]):
+            estimates = sum(roe_data[1:w+1] * x)/sum(x)
+            S_RIM_ROE_estimates.iloc[w] = estimates
+        else:
+            estimates = sum(roe_data[0:w] * x)/sum(x)
+            S_RIM_ROE_estimates.iloc[w-1] = estimates
+
+    return S_RIM_ROE_estimates
+
+
+# Micro-benchmark: per-series loop vs one 2-D cumulative sum call
+# every third series starts with NaN to exercise the average equity branch
+def benchmark_S_RIM_ROE_estimates(n_series=10000, n_years=5, seed=0):
+    rng = np.random.default_rng(seed)
+    roe = rng.normal(0.12, 0.05, (n_series, n_years))
+    roe[::3, 0] = np.nan
+
+    start = time.perf_counter()
+    loop_out = np.vstack([S_RIM_ROE_estimates_loop(pd.Series(row)).values for row in roe])
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    array_out = fs.S_RIM_ROE_estimates_array(roe)
+    array_time = time.perf_counter() - start
+
+    return {'series': n_series,
+            'years': n_years,
+            'loop_sec': loop_time,
+            'array_sec': array_time,
+            'speedup': loop_time / array_time,
+            'identical': np.array_equal(loop_out, array_out, equal_nan=True)}
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import cost_of_equity as ce
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    D, T = 120, 20
+    names = ce.MODELS['FF5']
+    ff = pd.DataFrame(rng.normal(0.005, 0.03, (D, 5)), columns=names)
+    ff['RF'] = 0.002
+    ff['date_ff_factors'] = pd.date_range('2000-01-31', periods=D, freq='ME')
+    R = ff[names].to_numpy() @ rng.normal(0.5, 0.5, (5, T)) + 0.002 + rng.normal(0, 0.04, (D, T))
+    ret = pd.DataFrame(R, index=pd.date_range('2000-01-01', periods=D, freq='MS'))
+    ret.iloc[:30, 3] = np.nan
+    return ret, ff
+
+
+def test_window_too_short_raises(data):
+    with pytest.raises(ValueError, match='window of 4'):
+        ce.rolling_coe(*data, 'FF5', window=4)
+
+
+def test_singular_windows_are_nan(data):
+    ret, ff = data
+    ff.loc[40:70, 'HML'] = 0.01                         # constant factor over those windows
+    out = ce.rolling_coe(ret, ff, 'FF3', window=24)
+    assert np.isnan(out['COE'][65]).all()
+    assert np.isfinite(out['COE'][110]).all()
+
+
+def test_expanding_blocks_match(data):
+    a = ce.rolling_coe(*data, 'FF3', window=36, expanding=True)
+    b = ce.rolling_coe(*data, 'FF3', window=36, expanding=True, block=3)
+    np.testing.assert_allclose(a['COE'], b['COE'])
+
+
+def test_premia_in_factor_order(data):
+    by_name = ce.estimate_coe(*data, 'FF3', premia={'HML': 0.03, 'Mkt-RF': 0.06, 'SMB': 0.02})
+    ordered = ce.estimate_coe(*data, 'FF3', premia=[0.06, 0.02, 0.03])
+    np.testing.assert_allclose(by_name['COE'], ordered['COE'])
+    with pytest.raises(ValueError):
+        ce.estimate_coe(*data, 'FF3', premia=[0.06, 0.02])
@@ -0,0 +1,35 @@
+import pytest
+
+import finance_scrapper as fs
+import fmp_bulk as fb
+import instrument as ins
+import providers
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    def respond(path, query):
+        if '/quote/' in path:
+            return (401, {'Error Message': 'Invalid API KEY'})
+        if '/income-statement/' in path:
+            return (403, {'Error Message': 'Forbidden'})
+        return []
+
+    server, base = fb.serve_stub(respond, latency=0.05)
+    monkeypatch.setattr(fs, 'BASE_URL', base)
+    monkeypatch.setattr(fs, 'cache', None)
+    monkeypatch.setattr(ins, 'echo', False)
+    yield
+    server.shutdown()
+
+
+def test_concurrent_failures_keep_their_own_errors(stub):
+    endpoints = {'quote': fb.SRIM_ENDPOINTS['quote'], 'IS': fb.SRIM_ENDPOINTS['IS']}
+    results, errors = fb.fetch_universe(['AAA'], 'k', endpoints=endpoints, max_in_flight=2, calls_per_minute=6000)
+
+    assert results['AAA'] == {'quote': None, 'IS': None}
+    assert errors[('AAA', 'quote')].startswith('get_quote HTTPError: 401')
+    assert errors[('AAA', 'IS')].startswith('get_income_statement HTTPError: 403')
+    # the run leaves the module provider and the registry as they were
+    assert fs.provider == 'fmp'
+    assert 'fmp_bulk' not in providers._factories
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+import industry_multiples as im
+
+
+def income_statement(records):
+    # shaped like fs.get_income_statement: fields x filings, newest first
+    IS = pd.DataFrame.from_dict(records).transpose()
+    IS.columns = IS.loc['fillingDate']
+    return IS
+
+
+def test_universe_inputs_bases_from_income_statement():
+    ev = {'AAA': pd.DataFrame({'date': ['2022-12-31', '2023-12-31'], 'enterpriseValue': [900.0, 1000.0],
+                               'addTotalDebt': [200.0, 300.0], 'minusCashAndCashEquivalents': [50.0, 100.0],
+                               'numberOfShares': [10.0, 10.0], 'stockPrice': [70.0, 80.0]})}
+    IS = {'AAA': income_statement([
+        {'date': '2023-12-31', 'fillingDate': '2024-02-01', 'ebitda': 120.0, 'operatingIncome': 90.0,
+         'researchAndDevelopmentExpenses': 30.0, 'revenue': 500.0},
+        {'date': '2022-12-31', 'fillingDate': '2023-02-01', 'ebitda': 100.0, 'operatingIncome': 70.0,
+         'researchAndDevelopmentExpenses': 20.0, 'revenue': 400.0}])}
+    universe = im.universe_inputs(ev, IS, {'AAA': 'Software'})
+
+    row = universe.loc['AAA']
+    assert (row['EBITDA'], row['EBIT'], row['EBITDAR&D'], row['Revenue']) == (120.0, 90.0, 150.0, 500.0)
+    assert row['net_debt'] == 200.0
+
+    multiples = pd.DataFrame({m: [10.0] for m in im.MULTIPLE_BASES},
+                             index=pd.CategoricalIndex(['Software'], name='Industry Name'))
+    out = im.multiples_valuation(universe, multiples, list(im.MULTIPLE_BASES))
+    assert out.loc['AAA', 'EV/EBITDA value_psh'] == (10 * 120.0 - 200.0) / 10
+    assert out.loc['AAA', 'EV/Sales value_psh'] == (10 * 500.0 - 200.0) / 10
+
+
+def test_universe_inputs_without_statements_is_nan():
+    ev = {'BBB': pd.DataFrame({'date': ['2023-12-31'], 'enterpriseValue': [1.0], 'addTotalDebt': [0.0],
+                               'minusCashAndCashEquivalents': [0.0], 'numberOfShares': [1.0], 'stockPrice': [1.0]})}
+    universe = im.universe_inputs(ev, {}, {})
+    assert np.isnan(universe.loc['BBB', list(im.MULTIPLE_BASES.values())].to_numpy(dtype=float)).all()
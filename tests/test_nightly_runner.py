@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+
+import finance_scrapper as fs
+import instrument as ins
+import nightly_runner as nr
+import providers
+
+DATES = [str(y) + '-09-30' for y in range(2022, 2007, -1)]      # newest first like FMP
+META = ['date', 'symbol', 'reportedCurrency', 'cik', 'fillingDate', 'acceptedDate', 'calendarYear', 'period']
+
+
+def statement(meta, fields, columns='fillingDate'):
+    # shaped like the fs getters: fields x filings
+    records = [dict({k: (d if k in ('date', 'fillingDate') else 'x') for k in meta},
+                    **{f: v[i] for f, v in fields.items()}) for i, d in enumerate(DATES)]
+    df = pd.DataFrame(records).transpose()
+    df.columns = df.loc[columns]
+    return df
+
+
+@pytest.fixture
+def getters(monkeypatch):
+    rng = np.random.default_rng(1)
+    n = len(DATES)
+    shares = 1e9 * np.linspace(1, 1.3, n)
+    tail = {'link': ['l'] * n, 'finalLink': ['f'] * n}
+    IS = statement(META, dict({'netIncome': rng.uniform(5e9, 9e9, n), 'weightedAverageShsOut': shares,
+                               'weightedAverageShsOutDil': shares * 1.01}, **tail))
+    BS = statement(META, dict({'totalStockholdersEquity': rng.uniform(4e10, 6e10, n)}, **tail))
+    FG = statement(['symbol', 'date', 'period'], {'threeYShareholdersEquityGrowthPerShare': rng.normal(0.05, 0.02, n)},
+                   'date')
+    ratios = statement(['symbol', 'date', 'period'], {'returnOnEquity': rng.uniform(0.1, 0.2, n)}, 'date').iloc[2:]
+    ttm = pd.DataFrame({'TTM Ratios': [0.17]}, index=['returnOnEquityTTM'])
+    monkeypatch.setattr(fs, 'get_income_statement', lambda t, l, k, p: IS)
+    monkeypatch.setattr(fs, 'get_balance_sheet', lambda t, l, k, p: BS)
+    monkeypatch.setattr(fs, 'get_financial_growth', lambda t, l, k: FG)
+    monkeypatch.setattr(fs, 'get_financial_ratios', lambda t, l, k, p: ttm if p == 'ttm' else ratios)
+    monkeypatch.setattr(fs, 'get_quote', lambda t, k: pd.DataFrame({0: [150.0]}, index=['price']))
+
+    idx = pd.date_range('2018-01-31', periods=60, freq='ME')
+    m = rng.normal(0.01, 0.04, 60)
+    prices = pd.DataFrame({'^GSPC': 100 * np.cumprod(1 + m),
+                           'AAA': 50 * np.cumprod(1 + 1.8 * m + rng.normal(0, 0.01, 60))}, index=idx)
+    return {'key': 'k', 'rf': 0.04, 'market_premium': 0.055, 'prices': prices}
+
+
+def test_beta_is_the_tickers_not_the_markets(getters):
+    row = nr.value_ticker('AAA', getters, {'name': None})
+    assert row['Beta'] == pytest.approx(1.8, abs=0.2)
+    assert row['Re'] == pytest.approx(0.04 + row['Beta'] * 0.055)
+
+
+class Unauthorized:
+    content = b'{"Error Message": "Invalid API KEY"}'
+
+    def raise_for_status(self):
+        raise requests.exceptions.HTTPError('401 Client Error: Unauthorized')
+
+
+class UnauthorizedProvider:
+    def get(self, url, **kwargs):
+        return Unauthorized()
+
+
+def test_fetch_failure_carries_the_http_error(monkeypatch, tmp_path):
+    # the real getters, on a provider answering 401
+    providers.register('unauthorized', UnauthorizedProvider)
+    monkeypatch.setattr(fs, 'provider', 'unauthorized')
+    monkeypatch.setattr(fs, 'cache', None)
+    monkeypatch.setattr(ins, 'echo', False)
+
+    out = nr.run(['AAA'], {'key': 'k'}, checkpoint_dir=str(tmp_path), processes=1, resume=False, verbose=False)
+    error = out['errors'].iloc[0]
+    assert (error['ticker'], error['stage'], error['error']) == ('AAA', 'statements', 'LookupError')
+    assert '401 Client Error' in error['message']
+    assert error['message'].startswith('get_income_statement HTTPError')
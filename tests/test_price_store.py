@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import providers
+from price_store import FIELDS, PriceStore
+
+
+def bars(n):
+    idx = pd.date_range('2024-01-01', periods=n, freq='D', name='Date')
+    close = 100 + np.arange(n, dtype=float)
+    return pd.DataFrame({f: close for f in FIELDS}, index=idx)
+
+
+@pytest.fixture
+def store(tmp_path):
+    fixtures = tmp_path / 'fixtures'
+    fixtures.mkdir()
+    bars(5).to_csv(fixtures / 'AAA.csv')
+    return PriceStore(str(tmp_path / 'store'), download=providers.FileProvider(str(fixtures)).download), fixtures
+
+
+def test_torn_append_is_rolled_back(store):
+    prices, fixtures = store
+    assert prices.refresh(['AAA'], '2024-01-01', '2024-02-01', '1d') == {'AAA': 'new'}
+
+    # an append that died after the Date and Open columns: no commit, so reads ignore it
+    for field in ['Date', 'Open']:
+        with open(prices.column_path('AAA', '1d', field), 'ab') as f:
+            f.write(np.zeros(1, dtype=np.int64 if field == 'Date' else np.float64).tobytes())
+    assert prices.frame('AAA', '1d').equals(bars(5))
+
+    bars(7).to_csv(fixtures / 'AAA.csv')
+    assert prices.refresh(['AAA'], '2024-01-01', '2024-02-01', '1d') == {'AAA': 'appended'}
+    pd.testing.assert_frame_equal(prices.frame('AAA', '1d'), bars(7), check_freq=False)
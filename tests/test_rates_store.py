@@ -0,0 +1,46 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import providers
+from rates_store import RatesStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    fixtures = tmp_path / 'fixtures'
+    fixtures.mkdir()
+    idx = pd.DatetimeIndex(['2024-01-02', '2024-01-03', '2024-01-04'], name='Date')
+    pd.DataFrame({'DGS10': [4.0, 4.1, 4.2]}, index=idx).to_csv(fixtures / 'DGS10.csv')
+    providers.register('rates_test', lambda: providers.FileRatesProvider(str(fixtures)))
+    return RatesStore(str(tmp_path / 'store'), provider='rates_test'), fixtures
+
+
+def test_unsynced_series_raises_key_error(store):
+    rates, _ = store
+    with pytest.raises(KeyError, match='DGS10'):
+        rates.asof('DGS10', ['2024-01-03'], 'DGS10')
+    with pytest.raises(KeyError, match='DGS10'):
+        rates.latest('DGS10')
+    assert not os.path.exists(rates.folder('DGS10'))
+
+
+def test_torn_append_is_rolled_back(store):
+    rates, fixtures = store
+    assert rates.sync(['DGS10']) == {'DGS10': 'new'}
+
+    # an append that died after the dates column: no commit, so reads ignore it
+    with open(rates.column_path('DGS10', None), 'ab') as f:
+        f.write(np.array([pd.Timestamp('2024-01-05').value], dtype=np.int64).tobytes())
+    assert len(rates.dates('DGS10')) == 3
+    assert rates.latest('DGS10') == 4.2
+
+    idx = pd.DatetimeIndex(['2024-01-02', '2024-01-03', '2024-01-04', '2024-01-05'], name='Date')
+    pd.DataFrame({'DGS10': [4.0, 4.1, 4.2, 4.3]}, index=idx).to_csv(fixtures / 'DGS10.csv')
+    assert rates.sync(['DGS10']) == {'DGS10': 'appended'}
+    frame = rates.frame('DGS10')
+    assert frame.index.equals(idx)
+    np.testing.assert_array_equal(frame['DGS10'], [4.0, 4.1, 4.2, 4.3])
+    np.testing.assert_array_equal(rates.asof('DGS10', ['2024-01-01', '2024-01-06'], 'DGS10'), [np.nan, 4.3])
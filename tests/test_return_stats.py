@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import return_stats as rs
+
+
+@pytest.fixture
+def prices():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(100 * np.cumprod(1 + rng.normal(0, 0.01, (3000, 3)), axis=0), columns=['^GSPC', 'A', 'B'])
+
+
+def test_chunked_dataframe_matches_one_pass(prices):
+    chunks = list(rs.iter_chunks(prices, 700))
+    assert [len(c) for c in chunks] == [700, 700, 700, 700, 200]
+    pd.testing.assert_frame_equal(rs.stream_stats(prices, chunk_rows=700), rs.stream_stats(prices, chunk_rows=5000))
+
+
+def test_unresolved_market_name_raises(prices):
+    with pytest.raises(ValueError, match='GSPC'):
+        rs.stream_stats(prices.to_numpy())
+    assert 'Beta' in rs.stream_stats(prices.to_numpy(), market=0)
+    assert 'Beta' not in rs.stream_stats(prices.to_numpy(), market=None)
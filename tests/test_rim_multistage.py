@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+
+import rim_multistage as rm
+
+
+def test_short_forward_curve_raises():
+    forward = rm.forward_rates(np.full(10, 0.04))
+    with pytest.raises(ValueError, match='N \\+ fade_years \\+ 1 = 16'):
+        rm.rim_multistage([100.0], [[0.12] * 5], [10.0], forward, [0.05], fade_years=10)
+
+
+def test_discount_table_shares_bucketed_premia():
+    forward = np.array([0.03, 0.04])
+    Re, DF = rm.discount_table(forward, [0.05, 0.05 + 1e-6, 0.06], step=1e-4)
+    assert Re.shape == DF.shape == (3, 2)
+    np.testing.assert_allclose(DF[0], [1 / 1.08, 1 / (1.08 * 1.09)])
+    assert (DF[1] == DF[0]).all()
+
+    Re, _ = rm.discount_table(forward, [0.05, 0.05 + 1e-6])
+    assert Re[1, 0] - Re[0, 0] == pytest.approx(1e-6)
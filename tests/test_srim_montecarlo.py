@@ -0,0 +1,28 @@
+import numpy as np
+
+import srim_montecarlo as mc
+
+INPUTS = {'B_0': 1e9, 'Num_Shares': 1e7, 'rf': 0.04, 'price': 100.0,
+          'ROE_1': ('normal', 0.12, 0.02), 'beta': ('fixed', 1.0),
+          'market_premium': ('fixed', 0.05), 'w': ('fixed', 1.0)}
+
+
+def test_summary_has_valid_count():
+    out = mc.simulate_ticker('AAA', INPUTS, n_sims=1000, chunk_size=300)
+    assert out['n_valid'] == 1000
+    assert out['P5'] < out['P50'] < out['P95']
+
+
+def test_all_scenarios_diverging_gives_nan_not_error():
+    # 1 + Re - w <= 0 in every scenario: the perpetuity never converges
+    inputs = dict(INPUTS, w=('fixed', 2.0))
+    out = mc.simulate_ticker('AAA', inputs, n_sims=1000, chunk_size=300)
+    assert out['n_valid'] == 0
+    assert np.isnan(out['P50']) and np.isnan(out['mean']) and np.isnan(out['prob_undervalued'])
+
+
+def test_universe_survives_a_diverging_ticker():
+    universe = {'AAA': INPUTS, 'BAD': dict(INPUTS, w=('fixed', 2.0))}
+    df = mc.simulate_universe(universe, n_sims=500, processes=1)
+    assert df.loc['AAA', 'n_valid'] == 500
+    assert df.loc['BAD', 'n_valid'] == 0